@@ -1 +1,4 @@
-from .main import *
\ No newline at end of file
+from .main import *
+from .engine import runEngine, BarCursor, TradeBuffer
+from .vectorized import runSignals
+from .sweep import runSweep, paramGrid
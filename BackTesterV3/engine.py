@@ -0,0 +1,211 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm as tqdm
+
+from extraction import features
+from extraction.alignment import Alignment, timesNs
+
+tradeColumns = ["timestamp", "close", "buying", "ticker", "coinAmount", "baseAmount", "profit", "timeHeld", "strategy"]
+
+# int64 value numpy reads as NaT
+NaT = np.iinfo(np.int64).min
+
+
+class SeriesArrays:
+    """Columns of one price frame as float arrays.
+    Indicator columns missing from the frame are computed through the registry on first access.
+    """
+
+    def __init__(self, P: pd.DataFrame) -> None:
+        self.features = features.FeatureFrame(P)
+        self.times = timesNs(P.index)
+        self.arrays = {}
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        values = self.arrays.get(column)
+        if values is None:
+            values = self.arrays[column] = np.ascontiguousarray(self.features[column].to_numpy(dtype=float))
+        return values
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+
+class BarCursor:
+    """A coin's series of one timeframe positioned at the bar being processed.
+    Reads never go past that bar, so a strategy cannot look ahead.
+
+    cursor["close"] is the current close, cursor.ago("close", 1) the one before and
+    cursor.window("close", 20) the last 20 closes up to the current bar as an array view.
+    """
+
+    __slots__ = ("series", "i")
+
+    def __init__(self, series: SeriesArrays, i: int = 0) -> None:
+        self.series = series
+        self.i = i
+
+    def __getitem__(self, column: str) -> float:
+        return self.series[column][self.i]
+
+    def ago(self, column: str, n: int = 1) -> float:
+        """Value n bars before the current one, NaN before the start of the data"""
+        j = self.i - n
+        return self.series[column][j] if j >= 0 else np.nan
+
+    def window(self, column: str, n: int) -> np.ndarray:
+        """Last n values up to and including the current bar (fewer at the start of the data)"""
+        return self.series[column][max(0, self.i - n + 1) : self.i + 1]
+
+    @property
+    def time(self) -> pd.Timestamp:
+        return pd.Timestamp(self.series.times[self.i])
+
+    def __len__(self) -> int:
+        # bars available so far
+        return self.i + 1
+
+
+class TradeBuffer:
+    """Trades in preallocated typed arrays grown by doubling, turned into the tradeData frame once at the end"""
+
+    dtypes = {
+        "timestamp": np.int64,
+        "close": np.float64,
+        "buying": np.bool_,
+        "ticker": object,
+        "coinAmount": np.float64,
+        "baseAmount": np.float64,
+        "profit": np.float64,
+        "timeHeld": np.int64,
+        "strategy": object,
+    }
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.n = 0
+        self.arrays = {name: np.empty(capacity, dtype=dtype) for name, dtype in self.dtypes.items()}
+
+    def add(self, timestamp, close, buying, ticker, coinAmount, baseAmount, profit, timeHeld, strategy):
+        if self.n == len(self.arrays["close"]):
+            for name, values in self.arrays.items():
+                self.arrays[name] = np.concatenate([values, np.empty(len(values), dtype=values.dtype)])
+        a, n = self.arrays, self.n
+        a["timestamp"][n] = timestamp
+        a["close"][n] = close
+        a["buying"][n] = buying
+        a["ticker"][n] = ticker
+        a["coinAmount"][n] = coinAmount
+        a["baseAmount"][n] = baseAmount
+        a["profit"][n] = profit
+        a["timeHeld"][n] = timeHeld
+        a["strategy"][n] = strategy
+        self.n += 1
+
+    def __len__(self) -> int:
+        return self.n
+
+    def toFrame(self) -> pd.DataFrame:
+        """tradeData in the format of runStrategy, missing values are NaN/NaT"""
+        out = {name: values[: self.n].copy() for name, values in self.arrays.items()}
+        out["timestamp"] = out["timestamp"].view("datetime64[ns]")
+        out["timeHeld"] = out["timeHeld"].view("timedelta64[ns]")
+        return pd.DataFrame(out, columns=tradeColumns)
+
+
+def runEngine(dat: dict, coins: list, buyStrat, sellStrat, lowestInterval: str = "1m", base: str = "BTC", baseAmount: int = 100, sinkLimit: int = 40, maxHold: int = 4*60, startTime=None, estSlip=0.001, warmup: int = 180, progress: bool = True) -> pd.DataFrame:
+    """Array based version of runStrategy, same trades for the same decisions.
+
+    Strategies are called as strategy(bar1m, bar15m, bar1h, strategyData) -> (bool, strategyData)
+    with BarCursor objects positioned at the current bar, instead of dataframes plus indices.
+    Like runStrategy one coin is held at a time and the first coin in coins that gives a buy is bought.
+    Every series is read on the 1m timeline of the first coin, see extraction.alignment, gaps and
+    misaligned series are logged before the run.
+
+    Args:
+        dat (dict): historical data dict
+        coins (list): list of coins to be traded
+        buyStrat (function): buy strategy
+        sellStrat (function): sell strategy
+        lowestInterval (str, optional): lowest time interval. Defaults to "1m".
+        base (str, optional): pair to trade with. Defaults to "BTC".
+        baseAmount (int, optional): starting amount of pair coins. Defaults to 100.
+        sinkLimit (int, optional): sell when the price sinks this many percent below the buy. Defaults to 40.
+        maxHold (int, optional): max minutes to hold a coin. Defaults to 4*60.
+        startTime (datetime, optional): first time to trade, data before minus warmup is dropped. Defaults to None.
+        estSlip (float, optional): estimated slippage per trade. Defaults to 0.001.
+        warmup (int, optional): bars skipped at the start. Defaults to 180.
+        progress (bool, optional): show a progress bar. Defaults to True.
+
+    Returns:
+        pd.DataFrame: tradeData, dataframe with all buy and sell data
+    """
+    if startTime is not None:
+        dat = {key: P[P.index > startTime - timedelta(minutes=180)] for key, P in dat.items()}
+
+    tradingFee = 0.00075
+    keep = 1 - tradingFee - estSlip
+    sinkRatio = 1 - (sinkLimit / 100)
+    # max time before selling, in ns
+    maxTimeHeld = maxHold * 60 * 10**9
+
+    tickers = [coin + base for coin in coins]
+    timeframes = (lowestInterval, "15m", "1h")
+    series = {key: SeriesArrays(dat[key]) for t in tickers for key in (f"{t}_{tf}" for tf in timeframes)}
+
+    # positions of every series on the 1m timeline of the first coin
+    alignment = Alignment(dat, list(series))
+    alignment.report()
+    times = alignment.times
+
+    cursors = [tuple(BarCursor(series[f"{t}_{tf}"]) for tf in timeframes) for t in tickers]
+    positions = [tuple(alignment[f"{t}_{tf}"] for tf in timeframes) for t in tickers]
+    closes = [series[f"{t}_{lowestInterval}"]["close"] for t in tickers]
+
+    trades = TradeBuffer()
+    strategyData = {"buyNext": False}
+    cash = baseAmount
+    held = None
+    buyPrice = buyTime = coinAmount = None
+
+    steps = range(warmup, len(times))
+    for index in tqdm(steps) if progress else steps:
+        timestamp = times[index]
+
+        if held is None:
+            for j, (bar1m, bar15m, bar1h) in enumerate(cursors):
+                p1m, p15m, p1h = positions[j]
+                bar1m.i, bar15m.i, bar1h.i = p1m[index], p15m[index], p1h[index]
+                if bar1m.i < 0 or bar15m.i < 0 or bar1h.i < 0:
+                    # coin has no data yet
+                    continue
+                buyNow, strategyData = buyStrat(bar1m, bar15m, bar1h, strategyData)
+                if buyNow:
+                    held, buyPrice, buyTime = j, closes[j][bar1m.i], timestamp
+                    coinAmount = keep * (cash / buyPrice)
+                    trades.add(timestamp, buyPrice, True, tickers[j], coinAmount, np.nan, np.nan, NaT, strategyData["buyStrat"])
+                    strategyData["buyTime"] = pd.Timestamp(timestamp)
+                    break
+            continue
+
+        bar1m, bar15m, bar1h = cursors[held]
+        p1m, p15m, p1h = positions[held]
+        bar1m.i, bar15m.i, bar1h.i = p1m[index], p15m[index], p1h[index]
+        sellNow, strategyData = sellStrat(bar1m, bar15m, bar1h, strategyData)
+        price = closes[held][bar1m.i]
+        sinkSell = price / buyPrice < sinkRatio
+        timeSell = timestamp - buyTime > maxTimeHeld
+        if sellNow or sinkSell or timeSell:
+            if sinkSell:
+                strategyUsed = "Sink Sell"
+            elif timeSell:
+                strategyUsed = "Time Sell"
+            else:
+                strategyUsed = strategyData["sellStrat"]
+            value = keep * (coinAmount * price)
+            profit = (value / cash - 1) * 100
+            trades.add(timestamp, price, False, tickers[held], np.nan, value, profit, timestamp - buyTime, strategyUsed)
+            cash, held = value, None
+
+    return trades.toFrame()
@@ -10,6 +10,9 @@ from tqdm import tqdm as tqdm
 import math
 import sys
 
+from extraction import features
+from extraction.alignment import Alignment, timesNs
+
 
 def runStrategy(dat:dict, coins:list, buyStrat, sellStrat, lowestInterval:str="1m", base:str="BTC", baseAmount:int=100, sinkLimit:int=40, maxHold:int=4*60, startTime=None, estSlip=0.001) -> pd.DataFrame:
     """Processes historical data trought strategy returning a trading data datafram
@@ -42,58 +45,46 @@ def runStrategy(dat:dict, coins:list, buyStrat, sellStrat, lowestInterval:str="1
     # Max time before selling
     maxTimeHeld = timedelta(minutes=maxHold)
 
-    # Trade data format
-    tradeData = pd.DataFrame(columns=["timestamp", 
-                                      "close",
-                                      "buying", 
-                                      "ticker", 
-                                      "coinAmount", 
-                                      "baseAmount", 
-                                      "profit", 
-                                      "timeHeld",
-                                      "strategy"])
-
-    # Get timeset list in lowest interval
-    timeTemp = [name for name in dat.keys() if lowestInterval in name]
-    timeTemp15m = [name for name in dat.keys() if "15m" in name]
-    timeTemp1h = [name for name in dat.keys() if "1h" in name]
-
-    timeset = dat[timeTemp[0]].index
-    timeset15m = dat[timeTemp15m[0]].index
-    timeset1h = dat[timeTemp1h[0]].index
-
-    
-    index1h = 0 
-    index15m = 0 
+    # Trade rows, the tradeData dataframe is built once at the end
+    trades = []
+
+    # indicators the precomputed data lacks are computed once when a strategy first reads them
+    frames = {key: features.FeatureFrame(P) for key, P in dat.items()}
+
+    # Timeline of the first coin in lowest interval, every series is read by position on it
+    timeset = dat[f"{coins[0]}{base}_{lowestInterval}"].index
+    keys = [f"{coin}{base}_{tf}" for coin in coins for tf in ["1m", "15m", "1h"]]
+    alignment = Alignment(dat, keys, timesNs(timeset))
+    for line in alignment.describe():
+        print(f"Alignment: {line}")
+    positions = {coin: [alignment[f"{coin}{base}_{tf}"] for tf in ["1m", "15m", "1h"]] for coin in coins}
+
     for index, timestamp in enumerate(tqdm(timeset)):
         if index < 180:
             continue
 
-        # basic variables
-        while timeset1h[index1h] != timestamp.replace(microsecond=0, second=0, minute=0):
-            index1h += 1
-
-        while (timeset15m[index15m].hour != timestamp.hour) or (timeset15m[index15m].minute != (timestamp.minute - timestamp.minute%15)):
-            index15m += 1
-
         for coin in coins:
             # Basic Variables
             ticker = coin + base
-            data1m = dat[ticker+"_1m"]
-            data15m = dat[ticker+"_15m"]
-            data1h = dat[ticker+"_1h"]
-            currentPrice = data1m["close"].iloc[index]
+            data1m = frames[ticker+"_1m"]
+            data15m = frames[ticker+"_15m"]
+            data1h = frames[ticker+"_1h"]
+            index1m, index15m, index1h = (p[index] for p in positions[coin])
+            if index1m < 0 or index15m < 0 or index1h < 0:
+                # no data for this coin yet
+                continue
+            currentPrice = data1m["close"].iloc[index1m]
             
 
             # strategy buy
             if bought == False:
-                buyNow, strategyData = buyStrat(data1m, data15m, data1h, strategyData, index, index15m, index1h)
+                buyNow, strategyData = buyStrat(data1m, data15m, data1h, strategyData, index1m, index15m, index1h)
                 if buyNow:
                     bought = True
                     boughtCoin = ticker
 
-                    if len(tradeData) > 0:
-                        baseAmount = tradeData["baseAmount"].iloc[-1]
+                    if len(trades) > 0:
+                        baseAmount = trades[-1]["baseAmount"]
                         
                     coinAmount = (1-tradingFee-estSlip) * (baseAmount/currentPrice)
                     summData = {"timestamp":timestamp,
@@ -106,7 +97,7 @@ def runStrategy(dat:dict, coins:list, buyStrat, sellStrat, lowestInterval:str="1
                                 "timeHeld": None,
                                 "strategy": strategyData["buyStrat"]
                                 }
-                    tradeData = tradeData.append(summData, ignore_index=True)
+                    trades.append(summData)
                     strategyData["buyTime"] = timestamp
                     break
                 continue
@@ -114,8 +105,8 @@ def runStrategy(dat:dict, coins:list, buyStrat, sellStrat, lowestInterval:str="1
             # strategy sell
             if bought and boughtCoin == ticker:
                 # sink limit sell
-                sellNow, strategyData = sellStrat(data1m, data15m, data1h, strategyData, index, index15m, index1h)
-                sinkSell =  currentPrice / tradeData["close"].iloc[-1] < (1 - (sinkLimit/100))
+                sellNow, strategyData = sellStrat(data1m, data15m, data1h, strategyData, index1m, index15m, index1h)
+                sinkSell =  currentPrice / trades[-1]["close"] < (1 - (sinkLimit/100))
                 timeSell = (timestamp - strategyData["buyTime"] > maxTimeHeld)
                 if sinkSell:
                     print("Emergency sell")
@@ -131,16 +122,16 @@ def runStrategy(dat:dict, coins:list, buyStrat, sellStrat, lowestInterval:str="1
                 if (sellNow or sinkSell or timeSell):
                     bought = False
 
-                    coinAmount = tradeData["coinAmount"].iloc[-1]
+                    coinAmount = trades[-1]["coinAmount"]
                     baseAmount = (1-tradingFee-estSlip) * (coinAmount * currentPrice)
 
-                    if len(tradeData) < 2:
+                    if len(trades) < 2:
                         profit = (baseAmount/baseAmount0-1) * 100
                     else:
-                        oldBaseAmount = tradeData["baseAmount"].iloc[-2]
+                        oldBaseAmount = trades[-2]["baseAmount"]
                         profit = (baseAmount/oldBaseAmount-1) * 100
 
-                    timeHeld = timestamp - tradeData["timestamp"].iloc[-1]
+                    timeHeld = timestamp - trades[-1]["timestamp"]
 
                     summData = {"timestamp": timestamp,
                                 "close": currentPrice,
@@ -152,8 +143,17 @@ def runStrategy(dat:dict, coins:list, buyStrat, sellStrat, lowestInterval:str="1
                                 "timeHeld": timeHeld,
                                 "strategy": strategyUsed
                                 }
-                    tradeData = tradeData.append(summData, ignore_index=True)
+                    trades.append(summData)
                     break
                 continue
 
+    tradeData = pd.DataFrame(trades, columns=["timestamp", 
+                                              "close",
+                                              "buying", 
+                                              "ticker", 
+                                              "coinAmount", 
+                                              "baseAmount", 
+                                              "profit", 
+                                              "timeHeld",
+                                              "strategy"])
     return tradeData
\ No newline at end of file
@@ -0,0 +1,257 @@
+import csv
+import inspect
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm as tqdm
+
+from BackTesterV3 import engine, vectorized
+from extraction import alignment, features
+from extraction import indicators as registry
+
+log = logging.getLogger("bot")
+
+# runStrategy arguments a sweep can vary, every other parameter goes to the strategies
+runParams = ["baseAmount", "sinkLimit", "maxHold", "estSlip", "startTime", "warmup"]
+metrics = ["profit", "trades", "winRate", "expectancy", "maxDrawdown"]
+
+
+class SharedDataset:
+    """Datadict placed in shared memory once, so worker processes map it instead of unpickling
+    dataframes per task. Every frame is one block: int64 times followed by its float64 columns.
+    The creating process owns the blocks and frees them with close().
+    """
+
+    def __init__(self, dat: dict = None, meta: dict = None) -> None:
+        self.blocks = []
+        self.owner = meta is None
+        if meta is None:
+            meta = {}
+            for key, P in dat.items():
+                values = P.to_numpy(dtype=float).T
+                times = alignment.timesNs(P.index)
+                block = shared_memory.SharedMemory(create=True, size=max(1, times.nbytes + values.nbytes))
+                np.ndarray(times.shape, np.int64, block.buf)[:] = times
+                np.ndarray(values.shape, np.float64, block.buf, offset=times.nbytes)[:] = values
+                self.blocks.append(block)
+                meta[key] = (block.name, list(P.columns), len(P))
+        else:
+            self.blocks = [shared_memory.SharedMemory(name=name) for name, _, _ in meta.values()]
+        self.meta = meta
+
+    @property
+    def dat(self) -> dict:
+        """Datadict with frames on top of the shared blocks, no copies of the values"""
+        dat = {}
+        for block, (key, (_, columns, n)) in zip(self.blocks, self.meta.items()):
+            times = np.ndarray((n,), np.int64, block.buf)
+            values = np.ndarray((len(columns), n), np.float64, block.buf, offset=times.nbytes)
+            index = pd.DatetimeIndex(times.view("datetime64[ns]"))
+            dat[key] = pd.DataFrame(values.T, index=index, columns=columns, copy=False)
+        return dat
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            if self.owner:
+                block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def paramGrid(**values) -> list:
+    """Every combination of parameter values, paramGrid(sinkLimit=[2, 5], maxHold=[60, 240]) gives 4 dicts"""
+    names = list(values)
+    return [dict(zip(names, combination)) for combination in itertools.product(*values.values())]
+
+
+def paramKey(params: dict) -> str:
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+def summarize(tradeData: pd.DataFrame, baseAmount: int = 100) -> dict:
+    """Performance numbers of a tradeData frame
+
+    Args:
+        tradeData (pd.DataFrame): trades as returned by runStrategy
+        baseAmount (int, optional): starting amount of pair coins. Defaults to 100.
+
+    Returns:
+        dict: profit (%), trades, winRate (%), expectancy (Tharp) and maxDrawdown (%)
+    """
+    profits = tradeData.loc[tradeData["buying"] == False, "profit"].to_numpy(dtype=float)
+    profits = profits[~np.isnan(profits)]
+    equity = np.r_[baseAmount, tradeData.loc[tradeData["buying"] == False, "baseAmount"].to_numpy(dtype=float)]
+    wins, losses = profits[profits > 0], profits[profits < 0]
+
+    expectancy = np.nan
+    if len(losses):
+        expectancy = (len(wins) / len(profits) * (wins.mean() if len(wins) else 0)
+            + len(losses) / len(profits) * losses.mean()) / -losses.mean()
+    peaks = np.maximum.accumulate(equity)
+    return {
+        "profit": (equity[-1] / baseAmount - 1) * 100,
+        "trades": len(profits),
+        "winRate": len(wins) / len(profits) * 100 if len(profits) else np.nan,
+        "expectancy": expectancy,
+        "maxDrawdown": ((peaks - equity) / peaks).max() * 100,
+    }
+
+
+def _strategyKwargs(strategy, params: dict) -> dict:
+    accepted = inspect.signature(strategy).parameters
+    return {name: value for name, value in params.items() if name in accepted}
+
+
+class _Bound:
+    """Strategy with sweep parameters bound as keyword arguments, keeps the name for trade labels"""
+
+    def __init__(self, strategy, kwargs: dict) -> None:
+        self.strategy = strategy
+        self.kwargs = kwargs
+        self.__name__ = getattr(strategy, "__name__", "strategy")
+
+    def __call__(self, *args):
+        return self.strategy(*args, **self.kwargs)
+
+
+def runOne(dat: dict, config: dict, params: dict) -> dict:
+    """Runs one parameter combination
+
+    Args:
+        dat (dict): historical data dict
+        config (dict): coins, buyStrat, sellStrat, mode and fixed run arguments, see runSweep
+        params (dict): parameters of this run
+
+    Returns:
+        dict: summarize output of the run
+    """
+    runArgs = dict(config["fixed"])
+    runArgs.update({name: value for name, value in params.items() if name in runParams})
+    strategyArgs = {name: value for name, value in params.items() if name not in runParams}
+
+    buyStrat, sellStrat = config["buyStrat"], config["sellStrat"]
+    if strategyArgs:
+        buyArgs, sellArgs = _strategyKwargs(buyStrat, strategyArgs), _strategyKwargs(sellStrat, strategyArgs)
+        buyStrat = _Bound(buyStrat, buyArgs)
+        sellStrat = _Bound(sellStrat, sellArgs)
+
+    if config["mode"] == "signals":
+        tradeData = vectorized.runSignals(dat, config["coins"], buyStrat, sellStrat, **runArgs)
+    else:
+        tradeData = engine.runEngine(dat, config["coins"], buyStrat, sellStrat, progress=False, **runArgs)
+    return summarize(tradeData, runArgs.get("baseAmount", 100))
+
+
+# state of a worker process, set once by _initWorker
+_worker = {}
+
+
+def _initWorker(meta: dict, config: dict):
+    _worker["dataset"] = SharedDataset(meta=meta)
+    _worker["dat"] = _worker["dataset"].dat
+    _worker["config"] = config
+
+
+def _safeRun(dat: dict, config: dict, params: dict):
+    # a failing combination is reported and left out of the results, so a resumed sweep retries it
+    try:
+        return params, runOne(dat, config, params), None
+    except Exception as e:
+        return params, None, repr(e)
+
+
+def _runTask(params: dict):
+    return _safeRun(_worker["dat"], _worker["config"], params)
+
+
+def _precompute(dat: dict, buyStrat, sellStrat) -> dict:
+    # indicators the strategies declare are computed once here instead of in every task
+    declared = features.strategyFeatures({}, buyStrat, sellStrat)
+    dat = dict(dat)
+    for key, P in dat.items():
+        specs = [
+            indicator for indicator in registry.validate(declared.get(key.split("_")[1], []))
+            if not all(column in P.columns for column in indicator.columns)
+        ]
+        if specs:
+            dat[key] = pd.concat([P, registry.compute(P, specs)], axis=1)
+    return dat
+
+
+def runSweep(dat: dict, coins: list, buyStrat, sellStrat, grid: list, results: str = "sweep.csv", mode: str = "signals", workers: int = None, progress: bool = True, **fixed) -> pd.DataFrame:
+    """Backtests every parameter combination of a grid on all cores.
+
+    The data is put in shared memory once and every worker process maps it. Results are appended
+    to a csv as runs finish, combinations already in it are skipped, so an interrupted sweep
+    continues where it stopped when started again.
+    Parameters named like runStrategy arguments (sinkLimit, maxHold, estSlip, ...) go to the backtest,
+    the others are passed as keyword arguments to the strategies that accept them.
+    Strategies must be module level functions so worker processes can import them.
+
+    Args:
+        dat (dict): historical data dict
+        coins (list): list of coins to be traded
+        buyStrat (function): buy strategy, signals function in signals mode
+        sellStrat (function): sell strategy, signals function in signals mode
+        grid (list): parameter dicts, see paramGrid
+        results (str, optional): results csv. Defaults to "sweep.csv".
+        mode (str, optional): "signals" for runSignals or "engine" for runEngine. Defaults to "signals".
+        workers (int, optional): worker processes. Defaults to every core.
+        progress (bool, optional): show a progress bar. Defaults to True.
+        fixed: other arguments of the backtest, the same for every run
+
+    Returns:
+        pd.DataFrame: the results table, one row per combination
+    """
+    if mode not in ("signals", "engine"):
+        raise ValueError(f"Unknown sweep mode: {mode}, options: signals, engine")
+    workers = workers or os.cpu_count()
+
+    done, header = set(), None
+    if os.path.exists(results):
+        done = set(pd.read_csv(results, usecols=["key"])["key"])
+        with open(results, newline="") as f:
+            header = next(csv.reader(f))
+    todo = [params for params in grid if paramKey(params) not in done]
+    log.info(f"Sweep: {len(grid)} combinations, {len(grid) - len(todo)} already done")
+
+    if todo:
+        names = sorted({name for params in grid for name in params})
+        config = {"coins": coins, "buyStrat": buyStrat, "sellStrat": sellStrat, "mode": mode, "fixed": fixed}
+        dat = _precompute(dat, buyStrat, sellStrat)
+
+        with open(results, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=header or ["key"] + names + metrics, extrasaction="ignore")
+            if header is None:
+                writer.writeheader()
+
+            def record(params, summary, error):
+                if error is not None:
+                    log.warning(f"Sweep run {paramKey(params)} failed: {error}")
+                    return
+                writer.writerow({"key": paramKey(params), **params, **summary})
+                f.flush()
+
+            if workers == 1:
+                for params in tqdm(todo) if progress else todo:
+                    record(*_safeRun(dat, config, params))
+            else:
+                with SharedDataset(dat) as dataset:
+                    with multiprocessing.Pool(workers, initializer=_initWorker, initargs=(dataset.meta, config)) as pool:
+                        runs = pool.imap_unordered(_runTask, todo)
+                        for params, summary, error in tqdm(runs, total=len(todo)) if progress else runs:
+                            record(params, summary, error)
+
+    return pd.read_csv(results)
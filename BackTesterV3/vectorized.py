@@ -0,0 +1,199 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from BackTesterV3.engine import NaT, tradeColumns
+from extraction import features
+from extraction.alignment import Alignment, alignIndex, timesNs
+
+
+def simulate(times: np.ndarray, close: np.ndarray, buy: np.ndarray, sell: np.ndarray, sinkLimit: int = 40, maxHold: int = 4*60, warmup: int = 180) -> dict:
+    """Resolves entries and exits of buy/sell signals with the position rules of runStrategy:
+    one coin held at a time, the first coin with a buy signal is bought, a position is sold on its
+    sell signal, when the price sinks sinkLimit percent below the buy or after maxHold minutes.
+
+    Python only runs once per trade, the bars in between are searched with numpy.
+
+    Args:
+        times (np.ndarray): bar times in ns
+        close (np.ndarray): time x coin close prices
+        buy (np.ndarray): time x coin buy signals
+        sell (np.ndarray): time x coin sell signals
+        sinkLimit (int, optional): sink sell percentage. Defaults to 40.
+        maxHold (int, optional): max minutes to hold a coin. Defaults to 4*60.
+        warmup (int, optional): bars skipped at the start. Defaults to 180.
+
+    Returns:
+        dict: entry, exit (-1 if still open), coin and reason ("sell", "sink" or "time") arrays, one item per trade
+    """
+    sinkRatio = 1 - (sinkLimit / 100)
+    maxTimeHeld = maxHold * 60 * 10**9
+    n = len(times)
+
+    anyBuy = buy.any(axis=1)
+    anyBuy[:warmup] = False
+    buyBars = np.flatnonzero(anyBuy)
+    firstCoin = np.argmax(buy[buyBars], axis=1) if len(buyBars) else np.empty(0, dtype=np.int64)
+    sellBars = [np.flatnonzero(sell[:, j]) for j in range(sell.shape[1])]
+
+    entries, exits, coins, reasons = [], [], [], []
+    position = warmup
+    while True:
+        k = np.searchsorted(buyBars, position)
+        if k == len(buyBars):
+            break
+        entry, coin = buyBars[k], firstCoin[k]
+        entries.append(entry)
+        coins.append(coin)
+
+        # first bar after the entry where each exit rule fires
+        s = np.searchsorted(sellBars[coin], entry + 1)
+        sellExit = sellBars[coin][s] if s < len(sellBars[coin]) else n
+        timeExit = np.searchsorted(times, times[entry] + maxTimeHeld, side="right")
+        end = min(sellExit, timeExit, n)
+        sunk = np.flatnonzero(close[entry + 1 : end + 1, coin] / close[entry, coin] < sinkRatio)
+        exit = min(end, entry + 1 + sunk[0]) if len(sunk) else end
+
+        if exit >= n:
+            exits.append(-1)
+            reasons.append("")
+            break
+        exits.append(exit)
+        if close[exit, coin] / close[entry, coin] < sinkRatio:
+            reasons.append("sink")
+        elif times[exit] - times[entry] > maxTimeHeld:
+            reasons.append("time")
+        else:
+            reasons.append("sell")
+        position = exit + 1
+
+    return {
+        "entry": np.array(entries, dtype=np.int64),
+        "exit": np.array(exits, dtype=np.int64),
+        "coin": np.array(coins, dtype=np.int64),
+        "reason": np.array(reasons, dtype=object),
+    }
+
+
+def tradesToFrame(trades: dict, times: np.ndarray, close: np.ndarray, tickers: list, baseAmount: int = 100, estSlip=0.001, labels: tuple = ("buy", "sell")) -> pd.DataFrame:
+    """tradeData frame of simulated trades, amounts and profits as runStrategy computes them
+
+    Args:
+        trades (dict): output of simulate
+        times (np.ndarray): bar times in ns
+        close (np.ndarray): time x coin close prices
+        tickers (list): ticker of every coin column
+        baseAmount (int, optional): starting amount of pair coins. Defaults to 100.
+        estSlip (float, optional): estimated slippage per trade. Defaults to 0.001.
+        labels (tuple, optional): strategy names of signal buys and sells. Defaults to ("buy", "sell").
+
+    Returns:
+        pd.DataFrame: tradeData, dataframe with all buy and sell data
+    """
+    tradingFee = 0.00075
+    keep = 1 - tradingFee - estSlip
+    reasonNames = {"sell": labels[1], "sink": "Sink Sell", "time": "Time Sell"}
+
+    entry, exit, coin = trades["entry"], trades["exit"], trades["coin"]
+    nRows = len(entry) + int((exit >= 0).sum())
+    out = {
+        "timestamp": np.empty(nRows, dtype=np.int64),
+        "close": np.empty(nRows),
+        "buying": np.zeros(nRows, dtype=bool),
+        "ticker": np.empty(nRows, dtype=object),
+        "coinAmount": np.full(nRows, np.nan),
+        "baseAmount": np.full(nRows, np.nan),
+        "profit": np.full(nRows, np.nan),
+        "timeHeld": np.full(nRows, NaT, dtype=np.int64),
+        "strategy": np.empty(nRows, dtype=object),
+    }
+    buyRows = np.arange(len(entry)) * 2
+    out["buying"][buyRows] = True
+    out["timestamp"][buyRows] = times[entry]
+    out["close"][buyRows] = close[entry, coin]
+    out["ticker"][buyRows] = [tickers[j] for j in coin]
+    out["strategy"][buyRows] = labels[0]
+
+    closed = exit >= 0
+    sellRows = buyRows[closed] + 1
+    out["timestamp"][sellRows] = times[exit[closed]]
+    out["close"][sellRows] = close[exit[closed], coin[closed]]
+    out["ticker"][sellRows] = [tickers[j] for j in coin[closed]]
+    out["timeHeld"][sellRows] = times[exit[closed]] - times[entry[closed]]
+    out["strategy"][sellRows] = [reasonNames[r] for r in trades["reason"][closed]]
+
+    # amounts chain from trade to trade, kept sequential so rounding matches runStrategy
+    cash = baseAmount
+    for i, row in enumerate(buyRows):
+        coinAmount = keep * (cash / out["close"][row])
+        out["coinAmount"][row] = coinAmount
+        if exit[i] < 0:
+            break
+        value = keep * (coinAmount * out["close"][row + 1])
+        out["baseAmount"][row + 1] = value
+        out["profit"][row + 1] = (value / cash - 1) * 100
+        cash = value
+
+    out["timestamp"] = out["timestamp"].view("datetime64[ns]")
+    out["timeHeld"] = out["timeHeld"].view("timedelta64[ns]")
+    return pd.DataFrame(out, columns=tradeColumns)
+
+
+def runSignals(dat: dict, coins: list, buySignals, sellSignals, lowestInterval: str = "1m", base: str = "BTC", baseAmount: int = 100, sinkLimit: int = 40, maxHold: int = 4*60, startTime=None, estSlip=0.001, warmup: int = 180) -> pd.DataFrame:
+    """Signal based backtest for strategies that are functions of indicator columns.
+
+    Signal functions are called once per coin as signals(data1m, data15m, data1h, index15m, index1h)
+    and return a boolean array over the 1m bars; index15m/index1h hold the position of the 15m/1h bar
+    of every 1m bar (-1 before the first), so data15m["EMA_40"].to_numpy()[index15m] puts a 15m
+    column on the 1m bars. Signals are then read on the 1m timeline of the first coin.
+    Trades follow runStrategy: same fees, slippage, sink and time sells and first coin wins.
+
+    Args:
+        dat (dict): historical data dict
+        coins (list): list of coins to be traded
+        buySignals (function): buy signals of a coin
+        sellSignals (function): sell signals of a coin
+        lowestInterval (str, optional): lowest time interval. Defaults to "1m".
+        base (str, optional): pair to trade with. Defaults to "BTC".
+        baseAmount (int, optional): starting amount of pair coins. Defaults to 100.
+        sinkLimit (int, optional): sink sell percentage. Defaults to 40.
+        maxHold (int, optional): max minutes to hold a coin. Defaults to 4*60.
+        startTime (datetime, optional): first time to trade, data before minus warmup is dropped. Defaults to None.
+        estSlip (float, optional): estimated slippage per trade. Defaults to 0.001.
+        warmup (int, optional): bars skipped at the start. Defaults to 180.
+
+    Returns:
+        pd.DataFrame: tradeData, dataframe with all buy and sell data
+    """
+    if startTime is not None:
+        dat = {key: P[P.index > startTime - timedelta(minutes=180)] for key, P in dat.items()}
+
+    tickers = [coin + base for coin in coins]
+    timeframes = (lowestInterval, "15m", "1h")
+    alignment = Alignment(dat, [f"{t}_{tf}" for t in tickers for tf in timeframes])
+    alignment.report()
+    times = alignment.times
+
+    close = np.full((len(times), len(tickers)), np.nan)
+    buy = np.zeros((len(times), len(tickers)), dtype=bool)
+    sell = np.zeros((len(times), len(tickers)), dtype=bool)
+    for j, ticker in enumerate(tickers):
+        data = [features.FeatureFrame(dat[f"{ticker}_{tf}"]) for tf in timeframes]
+        # signals are computed on the coin's own bars, then put on the timeline of the first coin
+        own = timesNs(data[0].index)
+        index15m = alignIndex(own, timesNs(data[1].index), "15m")
+        index1h = alignIndex(own, timesNs(data[2].index), "1h")
+        started = (index15m >= 0) & (index1h >= 0)
+        buySignal = np.asarray(buySignals(*data, index15m, index1h), dtype=bool) & started
+        sellSignal = np.asarray(sellSignals(*data, index15m, index1h), dtype=bool)
+
+        position = alignment[f"{ticker}_{lowestInterval}"]
+        valid = position >= 0
+        close[valid, j] = data[0]["close"].to_numpy(dtype=float)[position[valid]]
+        buy[valid, j] = buySignal[position[valid]]
+        sell[valid, j] = sellSignal[position[valid]]
+
+    trades = simulate(times, close, buy, sell, sinkLimit, maxHold, warmup)
+    labels = (getattr(buySignals, "__name__", "buy"), getattr(sellSignals, "__name__", "sell"))
+    return tradesToFrame(trades, times, close, tickers, baseAmount, estSlip, labels)
@@ -1,10 +1,13 @@
 from .misc import LockedError
+from .orders import OrderTracker
+from binance import ThreadedWebsocketManager
+import threading
 import logging
 
 log = logging.getLogger("bot")
 
 class Portfolio():
-    def __init__(self, client, base, coins) -> None:
+    def __init__(self, client, base, coins, stream: bool = True) -> None:
         self.bought = 0
         self.boughtCoin = 0
         self.locked = 0
@@ -20,21 +23,114 @@ class Portfolio():
         self.base = base
         self.coins = coins
 
-    def refresh(self, summary:bool=False):
-        # performance: ~2.6 seconds
-        self.baseTradeBalance = float(self.client.get_asset_balance(asset=self.base)["free"])
-        self.baseBalanceLocked = float(self.client.get_asset_balance(asset=self.base)["locked"])
-        self.BNBamount = float(self.client.get_asset_balance(asset="BNB")["free"])
+        # asset -> {"free": float, "locked": float}, kept current by the user data stream
+        self.balances = {}
+        # time (ms) of the latest account update the balances reflect
+        self.balanceTime = 0
+        # coin -> unsellable quantity left after a sell, balances up to it don't count as bought
+        self.dust = {}
+        self.condition = threading.Condition()
+        self.stream = stream
+        self.orders = OrderTracker()
+
+        self.loadBalances()
+        if stream:
+            self.startUserStream()
+
+    def loadBalances(self):
+        """Loads all balances with a single account call"""
+        account = self.client.get_account()
+        with self.condition:
+            self.balances = {
+                b["asset"]: {"free": float(b["free"]), "locked": float(b["locked"])}
+                for b in account["balances"]
+            }
+            self.balanceTime = max(self.balanceTime, account.get("updateTime", 0))
+            self.condition.notify_all()
+
+    def startUserStream(self):
+        twm = ThreadedWebsocketManager(
+            api_key=self.client.API_KEY, api_secret=self.client.API_SECRET, testnet=self.client.testnet
+        )
+        twm.start()
+        twm.start_user_socket(callback=self.handleUserMessage)
+        log.debug("User data websocket started")
+
+    def handleUserMessage(self, msg):
+        """Keeps balances and order states current from user data stream events"""
+        event = msg.get("e")
+        if event == "executionReport":
+            self.orders.handleExecutionReport(msg)
+        elif event == "outboundAccountPosition":
+            with self.condition:
+                for b in msg["B"]:
+                    self.balances[b["a"]] = {"free": float(b["f"]), "locked": float(b["l"])}
+                self.balanceTime = max(self.balanceTime, msg["u"])
+                self.condition.notify_all()
+        elif event == "balanceUpdate":
+            with self.condition:
+                balance = self.balances.setdefault(msg["a"], {"free": 0.0, "locked": 0.0})
+                balance["free"] += float(msg["d"])
+                self.condition.notify_all()
+        elif event == "error":
+            # balances may have been missed, fall back on the account call
+            log.error(f"User data websocket error: {msg}")
+            self.loadBalances()
+
+    def balance(self, asset: str) -> dict:
+        with self.condition:
+            return dict(self.balances.get(asset, {"free": 0.0, "locked": 0.0}))
+
+    def setDust(self, coin: str, quantity: float):
+        """Marks a coin balance up to quantity as dust, below the symbol's minimum order size"""
+        self.dust[coin] = max(self.dust.get(coin, 0.0), quantity)
+
+    def awaitOrderBalances(self, orderId: int, timeout: float = 1.0):
+        """Waits for the account update that follows the last execution report of an order.
+        Placing an order already sends an update (free to locked) before the fill, so any update
+        is not enough. Reloads the balances with an account call if it doesn't arrive in time or
+        balances are still locked.
+
+        Args:
+            orderId (int): order id
+            timeout (float, optional): max seconds to wait. Defaults to 1.0.
+        """
+        state = self.orders.state(orderId)
+        arrived = False
+        if state is not None:
+            with self.condition:
+                arrived = self.condition.wait_for(lambda: self.balanceTime >= state["time"], timeout)
+        locked = any(self.balance(asset)["locked"] > 0 for asset in [self.base] + list(self.coins))
+        if not arrived or locked:
+            log.debug(f"No account update after order {orderId} (locked: {locked}), loading balances")
+            self.loadBalances()
+
+    def refresh(self, summary:bool=False, orderId:int=None, timeout:float=1.0):
+        """Updates the portfolio values from the locally held balances
+
+        Args:
+            summary (bool, optional): log a summary. Defaults to False.
+            orderId (int, optional): order placed right before, waits until the balances include it. Defaults to None.
+            timeout (float, optional): seconds to wait for the balances of orderId. Defaults to 1.0.
+        """
+        if not self.stream:
+            self.loadBalances()
+        elif orderId is not None:
+            self.awaitOrderBalances(orderId, timeout)
+
+        self.baseTradeBalance = self.balance(self.base)["free"]
+        self.baseBalanceLocked = self.balance(self.base)["locked"]
+        self.BNBamount = self.balance("BNB")["free"]
 
         self.coinBalance = {}
         self.coinBalanceLocked = {}
         self.coinBalanceBought = {}
 
         for coin in self.coins:
-            balance = float(self.client.get_asset_balance(asset=coin)["free"])
-            locked = float(self.client.get_asset_balance(asset=coin)["locked"])
+            balance = self.balance(coin)["free"]
+            locked = self.balance(coin)["locked"]
             self.coinBalance[coin] = balance
-            if balance > 0:
+            if balance > self.dust.get(coin, 0.0):
                 self.coinBalanceBought[coin] = balance
                 self.coinTradeBalance = balance
             if locked > 0:
@@ -4,26 +4,27 @@ import pandas as pd
 from tqdm import tqdm as tqdm
 import logging
 import logging.config
-import time
 
 from . import misc
 from . import account
 from . import trade
 from . import pricewebsocket
+from . import orderbook
+from . import symbols
+from . import ringbuffer
+from extraction import alignment
 from extraction import extract
+from extraction import features
+from extraction import indicators as registry
+from extraction import streaming
+from extraction import transport
 
 logging.config.fileConfig("logging.conf")
 pd.set_option('display.max_rows', 500)
 pd.set_option('display.max_columns', 500)
 pd.set_option('display.width', 150)
 
-# Remove dependance on this later
-indicatorsDefault = ["EMA40", "EMA50", "EMA200", "RSI14", "MACD", "EMA500"]
-indicators15 = ["EMA40"]
-indicators1h = []
-indicatorsDefault = ["EMA40", "EMA50", "EMA200", "RSI14", "MACD", "EMA500", "BBANDS20", "ZSCORE30", "SLOPE1"]
-indicators15 = ["EMA40", "SLOPE1"]
-indicators1h = []
+# Indicators for strategies that don't declare their own features
 indicatorsDefault = ["EMA40", "EMA50", "EMA200", "RSI14", "MACD", "EMA500", "BBANDS20", "ZSCORE30", "SLOPE15", "SLOPE5", "SLOPE1"]
 indicators15 = ["EMA40", "SLOPE1"]
 indicators1h = ["ZSCORE30"]
@@ -40,9 +41,19 @@ def mainLoop(client, base, coins, timeRanges, buyStrat, sellStrat, sinkLimit:int
     """
     log = logging.getLogger("bot")
     log.debug("Starting bot")
+    # features the strategies declare (buyStrat.features = {"1m": [...], ...}), the defaults otherwise
+    featureSpecs = features.strategyFeatures(
+        {"1m": indicatorsDefault, "15m": indicators15, "1h": indicators1h}, buyStrat, sellStrat
+    )
+    # bad indicator specs fail here instead of after the websockets are up
+    for specs in featureSpecs.values():
+        registry.validate(specs)
+    # all REST calls share the pooled session and request weight budget
+    client = transport.Transport(client)
     misc.awaitStart()
     startInitTime = datetime.now()
     tradingFee = trade.getTradeFee(client)
+    symbolCache = symbols.SymbolCache(client)
     strategyData = {}
 
     # Portfolio init
@@ -51,6 +62,7 @@ def mainLoop(client, base, coins, timeRanges, buyStrat, sellStrat, sinkLimit:int
 
     # Websocket init
     pricesWS = pricewebsocket.priceDataWS(coins, timeRanges, base)
+    books = orderbook.OrderBooks([coin + base for coin in coins])
 
     bought, coinBalanceBought, boughtCoin, coinTradeBalance, baseTradeBalance = portfolio.values
 
@@ -72,20 +84,29 @@ def mainLoop(client, base, coins, timeRanges, buyStrat, sellStrat, sinkLimit:int
                                       "BNBAmount",
                                       "base"])
 
-    dat = extract.initBotData(client, coins, ["1m"], base)
-    dat15 = extract.initBotData(client, coins, ["15m"], base, hours=13)
-    dath = extract.initBotData(client, coins, ["1h"], base, hours=20)
-    dat.update(dat15)
-    dat.update(dath)
+    # one 1m download, 15m and 1h are built from it
+    dat = extract.initBotData(client, coins, timeRanges, base, hours={"1m": 9, "15m": 13, "1h": 20})
+    pricesWS.seed(dat)
+    # gaps or a timeframe out of step in the seed data would show strategies stale bars
+    alignment.Alignment.fromDatadict(dat, coins, base).report()
+
+    # Indicator state per series, updated per closed bar instead of recomputing the window
+    streams = {}
+    for tf in ["1m", "15m", "1h"]:
+        extract.genIndicatorsMultiple(dat, tf, featureSpecs[tf], inplace=True)
+        streams.update(streaming.initStreams(dat, tf, featureSpecs[tf]))
+
+    # Fixed size windows, new bars are appended in place of concat/iloc rolling
+    rings = ringbuffer.fromDatadict(dat)
 
-    dat = extract.genIndicatorsMultiple(dat, "1m", indicatorsDefault)
-    dat = extract.genIndicatorsMultiple(dat, "15m", indicators15)
+    # What strategies see, undeclared indicators are computed when read and dropped on the next bar
+    frames = {key: features.FeatureFrame(P) for key, P in dat.items()}
 
     startTime = next(iter(dat.values())).iloc[-1].name.to_pydatetime()
 
-    lastTime1m = next(iter(dat.values())).iloc[-1].name.to_pydatetime()
-    lastTime15m = next(iter(dat15.values())).iloc[-1].name.to_pydatetime()
-    lastTime1h = next(iter(dath.values())).iloc[-1].name.to_pydatetime()
+    lastTime1m = dat[f"{coins[0]}{base}_1m"].iloc[-1].name.to_pydatetime()
+    lastTime15m = dat[f"{coins[0]}{base}_15m"].iloc[-1].name.to_pydatetime()
+    lastTime1h = dat[f"{coins[0]}{base}_1h"].iloc[-1].name.to_pydatetime()
 
     misc.saveMarketData(dat, coins, base)
     endInitTime = (datetime.now() - startInitTime)
@@ -109,8 +130,10 @@ def mainLoop(client, base, coins, timeRanges, buyStrat, sellStrat, sinkLimit:int
     # Perhaps make this a parameter later:
     maxTradesPerMinute = 2
 
+    retry = False
     while True:
-        time.sleep(0.010)
+        # Block until bars close instead of polling, after a trade the strategy gets another pass straight away
+        event = pricesWS.nextUpdate(timeout=0 if retry else 1.0)
 
         timeDiffSeconds = (datetime.now() - lastTime1m).seconds
         lightDesync = timeDiffSeconds > 60
@@ -120,47 +143,51 @@ def mainLoop(client, base, coins, timeRanges, buyStrat, sellStrat, sinkLimit:int
         if heavyDesync:
             log.warning(f"Heavy Desync: {timeDiffSeconds}, {datetime.now()}, {lastTime1m}")
 
-        # 1 minute update
-        if pricesWS.updated["1m"]:
-            datTemp = misc.getLatestDataV2(pricesWS, dat, "1m", coins, base)
-            dat = extract.genIndicatorsMultiple(datTemp, "1m", indicatorsDefault)
-            minsBought = int((datetime.now() - strategyData["buyTime"]).seconds / 60) if bought else "-"
-            misc.saveMarketData(dat, coins, base)
-            log.info(f"m{mins}, 1min UPDATE, bought: {bought}, boughtCoin: {boughtCoin}, #trades: {nTrades}, minsBought: {minsBought}/{maxHoldMinutes}")
-            mins += 1
-            lastTime1m += timedelta(0, 60)
-            nTradesMinute = 0
-
-
-        # 15 minute update
-        if pricesWS.updated["15m"]:
-            datTemp = misc.getLatestDataV2(pricesWS, dat, "15m", coins, base)
-            dat = extract.genIndicatorsMultiple(datTemp, "15m", indicators15)
-            log.info(f"m{mins}, 15min UPDATE")
-            if bought:
-                log.info(dat[f"{boughtCoin}{base}_1m"].tail())
-            else:
-                log.info(dat[f"{coins[0]}{base}_1m"].tail())
-            lastTime15m += timedelta(0, 60*15)
-
-        # 1 hour update
-        if pricesWS.updated["1h"]:
-            datTemp = misc.getLatestDataV2(pricesWS, dat, "1h", coins, base)
-            dat = extract.genIndicatorsMultiple(datTemp, "1h", indicators1h)
-            log.info(f"m{mins}, 1h UPDATE")
-            lastTime1h += timedelta(0, 60*60)
-    
-
-        if (mins > 0) and not (pricesWS.updated["1m"] or heavyDesync or (nTradesMinute > maxTradesPerMinute)):
+        if event is not None:
+            interval, update = event
+            # frames read the ring buffers, a dataframe is only built for data a strategy reads
+            for key in misc.getLatestDataV3(update, rings, interval, streams):
+                frames[key].update(rings[key])
+
+            # 1 minute update
+            if interval == "1m":
+                minsBought = int((datetime.now() - strategyData["buyTime"]).seconds / 60) if bought else "-"
+                misc.saveMarketData({f"{coin}{base}_1m": frames[f"{coin}{base}_1m"].P for coin in coins}, coins, base)
+                # order calls only read the cache, stale metadata is reloaded off the loop
+                symbolCache.refreshIfStale()
+                log.info(f"m{mins}, 1min UPDATE, bought: {bought}, boughtCoin: {boughtCoin}, #trades: {nTrades}, minsBought: {minsBought}/{maxHoldMinutes}")
+                mins += 1
+                lastTime1m += timedelta(0, 60)
+                nTradesMinute = 0
+
+            # 15 minute update
+            elif interval == "15m":
+                log.info(f"m{mins}, 15min UPDATE")
+                if bought:
+                    log.info(frames[f"{boughtCoin}{base}_1m"].tail())
+                else:
+                    log.info(frames[f"{coins[0]}{base}_1m"].tail())
+                lastTime15m += timedelta(0, 60*15)
+
+            # 1 hour update
+            elif interval == "1h":
+                log.info(f"m{mins}, 1h UPDATE")
+                lastTime1h += timedelta(0, 60*60)
+        elif not retry:
+            continue
+        retry = False
+
+        # only evaluate once all closed bars are processed
+        if (mins > 0) and pricesWS.closed.empty() and not (heavyDesync or (nTradesMinute > maxTradesPerMinute)):
             loops += 1
             timestamp = datetime.now()
             ### STRATEGY HERE
             for coin in coins:
                 # Basic Variables
                 ticker = coin + base
-                data1m = dat[ticker+"_1m"]
-                data15m = dat[ticker+"_15m"]
-                data1h = dat[ticker+"_1h"]
+                data1m = frames[ticker+"_1m"]
+                data15m = frames[ticker+"_15m"]
+                data1h = frames[ticker+"_1h"]
                 currentPrice = data1m["close"].iloc[-1]
 
                 # strategy buy
@@ -170,8 +197,8 @@ def mainLoop(client, base, coins, timeRanges, buyStrat, sellStrat, sinkLimit:int
                     if buyNow:
                         log.info("Buying point found")
                         baseTradeBalance = portfolio.baseTradeBalance
-                        tseqStatus, _, _, _, FailMessage, slipLoss = trade.tradesequence(client, pricesWS, True, ticker, baseTradeBalance, portfolio)
-                        portfolio.refresh()
+                        tseqStatus, _, _, orderID, FailMessage, slipLoss = trade.tradesequence(client, pricesWS, True, ticker, baseTradeBalance, portfolio, books, symbolCache)
+                        portfolio.refresh(orderId=orderID)
                         bought, coinBalanceBought, boughtCoin, coinTradeBalance, _ = portfolio.values
                         coinAmount = portfolio.coinTradeBalance
 
@@ -199,6 +226,7 @@ def mainLoop(client, base, coins, timeRanges, buyStrat, sellStrat, sinkLimit:int
 
                         tradeData = tradeData.append(summData, ignore_index=True)
                         misc.logTradeData(tradeData, startTime, not tseqStatus)
+                        retry = True
                         break
                     continue
 
@@ -229,8 +257,8 @@ def mainLoop(client, base, coins, timeRanges, buyStrat, sellStrat, sinkLimit:int
                     if (sellNow or sinkSell or timeSell):
                         log.debug("sellNow or sinkSell or timeSell")
                         coinAmount = portfolio.coinTradeBalance
-                        tseqStatus, tseqAmount, tseqPrice_, _, FailMessage, slipLoss = trade.tradesequence(client, pricesWS, False, ticker, coinTradeBalance, portfolio)
-                        portfolio.refresh()
+                        tseqStatus, tseqAmount, tseqPrice_, orderID, FailMessage, slipLoss = trade.tradesequence(client, pricesWS, False, ticker, coinTradeBalance, portfolio, books, symbolCache)
+                        portfolio.refresh(orderId=orderID)
                         bought, coinBalanceBought, boughtCoin, coinTradeBalance, baseTradeBalance = portfolio.values
                         baseTradeBalance = portfolio.baseTradeBalance
                         
@@ -260,6 +288,7 @@ def mainLoop(client, base, coins, timeRanges, buyStrat, sellStrat, sinkLimit:int
                             strategyData["lastBaseAmount"] = baseTradeBalance
                             misc.storeSaveData(timestamp, baseTradeBalance, strategyData["lastBuy"])
                             nTrades += 0.5
+                        retry = True
                         break
                     continue
 
@@ -1,60 +1,51 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import pandas as pd
 import os
 import pandas_ta as ta
 from tqdm import tqdm as tqdm
 import glob
 import logging
+import time
+
+from extraction import storage, tradelog
 
 log = logging.getLogger("bot")
 
 
-def getLatestDataV2(priceWS, dat: dict, timeFrame: str, coins: list, base: str = "BTC"):
-    """Get the last row of historical data
+def getLatestDataV3(update: dict, rings: dict, timeFrame: str, streams: dict = None) -> list:
+    """Append the latest closed bars of a timeframe to the ring buffers, no dataframes are built
 
     Args:
-        dat (dict): datadict in default format
+        update (dict): dataset name -> (timestamp, bar) as delivered by priceDataWS.nextUpdate
+        rings (dict): dataset name -> RingBuffer, see ringbuffer.fromDatadict
         timeFrame (str): the time format to look at
+        streams (dict, optional): indicator streams, their values are written into the new bars. Defaults to None.
 
     Returns:
-        (bool, dict): callback if price retrieved, updated datadict with latest data
+        list: names of the datasets that got a new bar
     """
-    dataSets = list(dat.keys())
-    # update = getHistWSv2(coins, timeFrame, base)
-    while True:
-        if priceWS.updated[timeFrame]:
-            update = priceWS.histData
-            priceWS.updated[timeFrame] = False
-            break
-
-    for dataSet in dataSets:
-        idd = dataSet.split("_")
-        iddTicker = idd[0]
-        iddTimeFrame = idd[1]
-        if iddTimeFrame == timeFrame:
-            currentDf = dat[dataSet]
-            temp = update[f"{iddTicker}_{iddTimeFrame}"]
-            # delete oldest
-            currentDf = currentDf.iloc[1:]
-            # add latest
-            currentDf = pd.concat([currentDf, temp])
-
-            if currentDf.index[-1] == currentDf.index[-2]:
-                log.warning("duplication error")
-            else:
-                dat[dataSet] = currentDf
-
-    return dat
+    updated = []
+    for dataSet, ring in rings.items():
+        if dataSet.split("_")[1] != timeFrame:
+            continue
+        timestamp, bar = update[dataSet]
+        if not ring.append(timestamp, bar):
+            continue
+        if streams is not None and dataSet in streams:
+            values = streams[dataSet].update(timestamp, bar)
+            if values:
+                ring.setLast(values)
+        updated.append(dataSet)
 
+    return updated
 
-def getLastTradeData(foldername="logData"):
-    list_of_files = glob.glob(os.path.join(f"{foldername}/*0.csv"))
-    latest_file = max(list_of_files, key=os.path.getctime)
 
-    P = pd.read_csv(latest_file)
+def getLastTradeData(foldername="logData"):
+    # the catalog only parses what was appended to the logs since the last call
+    trades = tradelog.TradeLog(foldername)
+    P = trades.fileRows(trades.latest()).drop(columns="source")
     P = P[P["failed"].isin([False, "False"])]
-    P["timestamp"] = pd.to_datetime(P["timestamp"])
-    P = P.iloc[-3:, 1::]
+    P = P.iloc[-3:]
 
     assert len(P) >= 3, f"Latest trade data fail\n {P}"
 
@@ -62,14 +53,14 @@ def getLastTradeData(foldername="logData"):
 
 
 def awaitStart():
+    """Sleeps until second 1-3 of a minute"""
     log.debug(f"Awaiting start...")
-    while True:
-        if (int(datetime.now().strftime("%S")) > 0) and (
-            int(datetime.now().strftime("%S")) < 4
-        ):
-            break
-        else:
-            continue
+    now = datetime.now()
+    if not (0 < now.second < 4):
+        start = now.replace(second=1, microsecond=0)
+        if now.second > 0:
+            start += timedelta(minutes=1)
+        time.sleep((start - now).total_seconds())
     log.debug(f"Starting...")
 
 
@@ -136,6 +127,7 @@ def loadSaveData(filename="storedData/storedData.csv"):
     return time, float(baseAmount), float(lastBuyPrice)
 
 
-def saveMarketData(dat, coins, base, folder="marketData"):
+def saveMarketData(dat, coins, base, folder="marketData", backend="npy"):
+    """Saves the 1m data of every coin, binary by default, backend="csv" for the older text files"""
     for coin in coins:
-        dat[f"{coin}{base}_1m"].to_csv(f"{folder}/{coin}{base}_1m.csv")
\ No newline at end of file
+        storage.save(dat[f"{coin}{base}_1m"], f"{folder}/{coin}{base}_1m", backend)
\ No newline at end of file
@@ -0,0 +1,160 @@
+from binance import ThreadedWebsocketManager
+import numpy as np
+import threading
+import time
+import logging
+
+from extraction import transport
+
+log = logging.getLogger("bot")
+
+
+def findLevelArrays(prices: np.ndarray, qtys: np.ndarray, target: float, scale: float = 1.0):
+    """Walks order book levels until the cumulative depth exceeds target
+
+    Args:
+        prices (np.ndarray): level prices, best first
+        qtys (np.ndarray): level quantities
+        target (float): depth to exceed
+        scale (float, optional): multiplier turning quantities into target units, e.g. the coin price for depth in base. Defaults to 1.0.
+
+    Returns:
+        (float, float): price of the level reached and volume weighted average price up to it, None if the book is too thin
+    """
+    cumQty = np.cumsum(qtys)
+    i = np.searchsorted(cumQty * scale, target, side="right")
+    if i >= len(cumQty):
+        return None
+    wavg = np.dot(prices[: i + 1], qtys[: i + 1]) / cumQty[i]
+    return prices[i], wavg
+
+
+class LocalOrderBook:
+    """Order book of one symbol kept in sync from the websocket depth diff stream.
+
+    Follows the binance procedure: diffs are buffered while a REST snapshot is fetched, stale diffs are
+    dropped and a gap in update ids triggers a new snapshot.
+    """
+
+    def __init__(self, symbol: str, limit: int = 1000) -> None:
+        self.symbol = symbol
+        self.limit = limit
+        self.bids = {}
+        self.asks = {}
+        self.lastUpdateId = None
+        self.buffer = []
+        self.synced = False
+        self.resyncing = False
+        self.lock = threading.Lock()
+
+    def handleDiff(self, msg: dict):
+        with self.lock:
+            if not self.synced:
+                self.buffer.append(msg)
+                return
+            if msg["u"] <= self.lastUpdateId:
+                return
+            if msg["U"] != self.lastUpdateId + 1:
+                log.warning(f"{self.symbol} order book gap: {self.lastUpdateId} -> {msg['U']}, resyncing")
+                self.buffer.append(msg)
+                self._startResync()
+                return
+            self._apply(msg)
+
+    def _apply(self, msg: dict):
+        for side, key in ((self.bids, "b"), (self.asks, "a")):
+            for price, qty in msg[key]:
+                qty = float(qty)
+                if qty == 0:
+                    side.pop(float(price), None)
+                else:
+                    side[float(price)] = qty
+        self.lastUpdateId = msg["u"]
+
+    def _startResync(self):
+        self.synced = False
+        if not self.resyncing:
+            self.resyncing = True
+            threading.Thread(target=self.resync, daemon=True).start()
+
+    def resync(self):
+        """Loads a REST snapshot and replays the buffered diffs on top of it"""
+        from .trade import getOrderBook
+
+        while True:
+            try:
+                snapshot = getOrderBook(self.symbol, self.limit, transport.NORMAL)
+            except Exception as e:
+                log.error(f"{self.symbol} order book snapshot failed: {e}")
+                time.sleep(1)
+                continue
+
+            with self.lock:
+                self.bids = {float(p): float(q) for p, q in snapshot["bids"]}
+                self.asks = {float(p): float(q) for p, q in snapshot["asks"]}
+                self.lastUpdateId = snapshot["lastUpdateId"]
+                buffered = [m for m in self.buffer if m["u"] > self.lastUpdateId]
+
+                # the first diff has to overlap the snapshot and every next one has to follow on
+                gap = False
+                for m in buffered:
+                    if m["U"] > self.lastUpdateId + 1:
+                        gap = True
+                        break
+                    self._apply(m)
+
+                if not gap:
+                    self.buffer = []
+                    self.synced = True
+                    self.resyncing = False
+                    log.debug(f"{self.symbol} order book synced at {self.lastUpdateId}")
+                    return
+
+            # snapshot older than the buffered diffs, get a newer one
+            time.sleep(0.5)
+
+    def levels(self, buying: bool, n: int = None):
+        """Best n levels of the side you would trade against
+
+        Args:
+            buying (bool): asks when buying, bids when selling
+            n (int, optional): number of levels. Defaults to all.
+
+        Returns:
+            (np.ndarray, np.ndarray): prices and quantities, best first
+        """
+        with self.lock:
+            side = self.asks if buying else self.bids
+            prices = np.fromiter(side.keys(), dtype=float, count=len(side))
+            qtys = np.fromiter(side.values(), dtype=float, count=len(side))
+        order = np.argsort(prices if buying else -prices)[:n]
+        return prices[order], qtys[order]
+
+
+class OrderBooks:
+    """Local order books for a list of symbols on one multiplexed depth stream"""
+
+    def __init__(self, symbols: list, limit: int = 1000) -> None:
+        self.books = {symbol: LocalOrderBook(symbol, limit) for symbol in symbols}
+
+        twm = ThreadedWebsocketManager()
+        twm.start()
+        streams = [f"{symbol.lower()}@depth@100ms" for symbol in symbols]
+        twm.start_multiplex_socket(callback=self.handleMessage, streams=streams)
+
+        # snapshots after subscribing so the diffs in between are buffered
+        for book in self.books.values():
+            with book.lock:
+                book._startResync()
+        log.debug("Order book websocket started")
+
+    def handleMessage(self, msg: dict):
+        data = msg.get("data", {})
+        book = self.books.get(data.get("s"))
+        if book is not None and data.get("e") == "depthUpdate":
+            book.handleDiff(data)
+
+    def get(self, symbol: str):
+        """Synced book of a symbol, None if not available"""
+        book = self.books.get(symbol)
+        return book if book is not None and book.synced else None
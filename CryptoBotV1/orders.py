@@ -0,0 +1,56 @@
+from collections import OrderedDict
+import threading
+import logging
+
+log = logging.getLogger("bot")
+
+finalStatuses = ["FILLED", "CANCELED", "REJECTED", "EXPIRED"]
+
+
+class OrderTracker:
+    """Latest state of recent orders, fed by executionReport events of the user data stream"""
+
+    def __init__(self, maxOrders: int = 500) -> None:
+        self.maxOrders = maxOrders
+        self.orders = OrderedDict()
+        self.condition = threading.Condition()
+
+    def handleExecutionReport(self, msg: dict):
+        state = {
+            "status": msg["X"],
+            "executedQty": float(msg["z"]),
+            "quoteQty": float(msg["Z"]),
+            "lastPrice": float(msg["L"]),
+            # transaction time, the account update that follows the report is at least as late
+            "time": msg["T"],
+        }
+        with self.condition:
+            # reports can arrive before the order call returned, so every order is kept
+            self.orders[msg["i"]] = state
+            self.orders.move_to_end(msg["i"])
+            while len(self.orders) > self.maxOrders:
+                self.orders.popitem(last=False)
+            self.condition.notify_all()
+
+    def state(self, orderId: int) -> dict:
+        with self.condition:
+            state = self.orders.get(orderId)
+            return dict(state) if state is not None else None
+
+    def wait(self, orderId: int, timeout: float) -> dict:
+        """Blocks until the order reaches a final status or the timeout passes
+
+        Args:
+            orderId (int): order id
+            timeout (float): max seconds to wait
+
+        Returns:
+            dict: latest known state (status, executedQty, quoteQty, lastPrice, time), None if no report arrived
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: orderId in self.orders and self.orders[orderId]["status"] in finalStatuses,
+                timeout,
+            )
+            state = self.orders.get(orderId)
+            return dict(state) if state is not None else None
@@ -1,7 +1,12 @@
 from binance import ThreadedWebsocketManager
 import pandas as pd
 from datetime import datetime
+import threading
+import time
 import logging
+import queue
+
+from extraction import bars, extract
 
 log = logging.getLogger("ws")
 
@@ -20,14 +25,70 @@ class priceDataWS:
         self.coins = coins
         self.histData = {}
         self.liveData = {}
-        self.updateCount = {"1m": 0, "15m": 0, "1h": 0}
+        self.pending = {interval: {} for interval in intervals}
         self.counter = 0
-        self.updated = {"1m": False, "15m": False, "1h": False}
-        self.getPrices(intervals, base)
+        # higher intervals are built from the 1m stream, see seed()
+        self.builders = {f"{coin}{base}": bars.BarBuilder(intervals) for coin in coins}
+        self.seeded = False
+        self.unseeded = []
+        self.lock = threading.Lock()
+        # (interval, {dataset name: (timestamp, bar)}) once all coins closed a bar of that interval
+        self.closed = queue.Queue()
         self.BNBPrice = 0
         self.basePrice = 0
+        self.getPrices(intervals, base)
         log.debug("PriceData websocket started")
 
+    def nextUpdate(self, timeout: float = None):
+        """Blocks until all coins closed a bar of some interval
+
+        Args:
+            timeout (float, optional): max seconds to wait. Defaults to None (forever).
+
+        Returns:
+            (str, dict): interval and {dataset name: (timestamp, bar)}, None on timeout
+        """
+        try:
+            return self.closed.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def seed(self, dat: dict):
+        """Fills the bar builders with the closed 1m bars of the current higher interval buckets.
+        Bars closed on the stream before this are replayed after the history.
+
+        Args:
+            dat (dict): price data from initBotData including the 1m datasets
+        """
+        nowMs = int(time.time() * 1000)
+        with self.lock:
+            for sym, builder in self.builders.items():
+                P = dat[f"{sym}_1m"]
+                opens = extract.openTimes(P.index)
+                closed = opens + 60000 <= nowMs
+                records = P.loc[closed, ["open", "high", "low", "close", "volume"]].to_dict("records")
+                # bars completed in the history are already in dat, only the open buckets are kept
+                for openMs, bar in zip(opens[closed], records):
+                    builder.add(int(openMs), bar)
+
+            for sym, openMs, bar in self.unseeded:
+                self.addBar(sym, openMs, bar)
+            self.unseeded = []
+            self.seeded = True
+
+    def addBar(self, sym: str, openMs: int, bar: dict):
+        """Queues a closed 1m bar and the higher interval bars it completes"""
+        closedBars = [("1m", openMs, bar)] + self.builders[sym].add(openMs, bar)
+        for interval, t, b in closedBars:
+            timestamp = pd.Timestamp(tsToDt(t + 60000))
+            key = f"{sym}_{interval}"
+            self.histData[key] = (timestamp, b)
+            self.pending[interval][key] = (timestamp, b)
+
+            if len(self.pending[interval]) == len(self.coins):
+                self.closed.put((interval, self.pending[interval]))
+                self.pending[interval] = {}
+
     def getPrices(self, intervals, base):
         twm = ThreadedWebsocketManager()
         twm.start()
@@ -37,7 +98,6 @@ class priceDataWS:
 
             sym = msg["data"]["s"]
             m = msg["data"]["k"]
-            interval = m["i"]
 
             if sym in ["BNBUSDT", f"{base}USDT"]:
                 # BNB and base data
@@ -47,34 +107,28 @@ class priceDataWS:
                     self.basePrice = m["c"]
             else:
                 # Closed Historical Data
-                # print(self.updateCount[interval])
                 if m["x"] == True:
-                    klines = [
-                        [float(m["t"]) + 60000, m["o"], m["c"], m["l"], m["h"], m["v"]]
-                    ]
-                    columns = ["timestamp", "open", "high", "low", "close", "volume"]
-
-                    P = pd.DataFrame(klines, columns=columns).astype("float")
-
-                    P["datetime"] = P["timestamp"].apply(tsToDt)
-                    P.set_index(pd.DatetimeIndex(P["datetime"]), inplace=True)
-                    P.drop(["timestamp", "datetime"], inplace=True, axis=1)
-
-                    self.histData[f"{sym}_{interval}"] = P
-                    self.updateCount[interval] += 1
-
-                    if self.updateCount[interval] == len(self.coins):
-                        self.updated[interval] = True
-                        self.updateCount[interval] = 0
+                    bar = {
+                        "open": float(m["o"]),
+                        "high": float(m["h"]),
+                        "low": float(m["l"]),
+                        "close": float(m["c"]),
+                        "volume": float(m["v"]),
+                    }
+                    with self.lock:
+                        if self.seeded:
+                            self.addBar(sym, int(m["t"]), bar)
+                        else:
+                            self.unseeded.append((sym, int(m["t"]), bar))
 
                 # Live Data
-                elif interval == "1m":
+                else:
                     self.liveData[sym] = m["c"]
 
+        # only 1m klines, 15m and 1h bars are built from them
         streams = []
-        for interval in intervals:
-            for coin in self.coins:
-                streams.append(f"{coin.lower() + base.lower()}@kline_{interval}")
+        for coin in self.coins:
+            streams.append(f"{coin.lower() + base.lower()}@kline_1m")
 
         # add BNB and base usd price
         streams.append(f"{('BNBUSDT'.lower())}@kline_1m")
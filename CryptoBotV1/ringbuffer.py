@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+import logging
+
+log = logging.getLogger("bot")
+
+
+class RingBuffer:
+    """Preallocated fixed capacity window of bars for one (ticker, timeframe).
+
+    Every row is written twice, at i and i + capacity, so the current window is always one
+    contiguous slice and columns can be handed out as zero-copy numpy views.
+    Appending past capacity evicts the oldest bar in O(1).
+    """
+
+    def __init__(self, capacity: int, columns: list) -> None:
+        self.capacity = capacity
+        self.columns = list(columns)
+        self._colIndex = {column: i for i, column in enumerate(self.columns)}
+        self._data = np.full((len(self.columns), 2 * capacity), np.nan)
+        self._times = np.zeros(2 * capacity, dtype="int64")
+        self.head = 0
+        self.size = 0
+
+    @classmethod
+    def fromFrame(cls, P: pd.DataFrame, capacity: int = None):
+        """Creates a ring buffer holding the (last capacity) rows of a dataframe
+
+        Args:
+            P (pd.DataFrame): price data Dataframe with a DatetimeIndex
+            capacity (int, optional): window size. Defaults to len(P).
+
+        Returns:
+            RingBuffer: filled ring buffer
+        """
+        ring = cls(capacity or len(P), P.columns)
+        ring.extend(P.index, P.to_numpy(dtype=float))
+        return ring
+
+    def __len__(self) -> int:
+        return self.size
+
+    def addColumn(self, column: str) -> None:
+        """Adds an (all NaN) column, reallocates so should not be done per bar"""
+        if column in self._colIndex:
+            return
+        self._colIndex[column] = len(self.columns)
+        self.columns.append(column)
+        self._data = np.vstack([self._data, np.full((1, 2 * self.capacity), np.nan)])
+
+    def extend(self, index, values: np.ndarray) -> int:
+        """Appends rows in order, evicting the oldest rows once full.
+        Rows that are not strictly newer than the row before them are dropped.
+
+        Args:
+            index (DatetimeIndex): timestamps of the rows
+            values (np.ndarray): (rows x columns) values, columns in self.columns order
+
+        Returns:
+            int: number of rows added
+        """
+        times = np.asarray(pd.DatetimeIndex(index), dtype="datetime64[ns]").view("int64")
+        if not len(times):
+            return 0
+        values = np.asarray(values, dtype=float).reshape(len(times), len(self.columns))
+
+        # vectorized duplicate / out of order check against the previous row
+        previous = np.empty_like(times)
+        previous[0] = self._times[self.head + self.size - 1] if self.size else np.iinfo("int64").min
+        previous[1:] = times[:-1]
+        keep = times > previous
+        if not keep.all():
+            log.warning(f"duplication error: dropping {int((~keep).sum())} bars")
+            times, values = times[keep], values[keep]
+
+        if len(times) >= self.capacity:
+            self.head, self.size = 0, 0
+            times, values = times[-self.capacity :], values[-self.capacity :]
+
+        pos = (self.head + self.size + np.arange(len(times))) % self.capacity
+        self._times[pos] = self._times[pos + self.capacity] = times
+        self._data[:, pos] = self._data[:, pos + self.capacity] = values.T
+
+        evicted = max(0, self.size + len(times) - self.capacity)
+        self.head = (self.head + evicted) % self.capacity
+        self.size = min(self.capacity, self.size + len(times))
+        return len(times)
+
+    def append(self, timestamp, bar: dict) -> bool:
+        """Appends a single bar, missing columns are NaN
+
+        Args:
+            timestamp (datetime): bar timestamp
+            bar (dict): column -> value
+
+        Returns:
+            bool: False if the bar was a duplicate and dropped
+        """
+        row = [bar.get(column, np.nan) for column in self.columns]
+        return self.extend([timestamp], [row]) == 1
+
+    def setLast(self, values: dict) -> None:
+        """Writes values (e.g. indicators) into the newest row"""
+        if not self.size:
+            return
+        pos = (self.head + self.size - 1) % self.capacity
+        for column, value in values.items():
+            if column not in self._colIndex:
+                self.addColumn(column)
+            i = self._colIndex[column]
+            self._data[i, pos] = self._data[i, pos + self.capacity] = value
+
+    def column(self, column: str) -> np.ndarray:
+        """Zero-copy view of a column, oldest to newest"""
+        return self._data[self._colIndex[column], self.head : self.head + self.size]
+
+    @property
+    def times(self) -> np.ndarray:
+        """Zero-copy view of the timestamps in ns since epoch, oldest to newest"""
+        return self._times[self.head : self.head + self.size]
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self.times.view("datetime64[ns]"))
+
+    def last(self) -> dict:
+        """Newest row as column -> value"""
+        values = self._data[:, self.head + self.size - 1]
+        return dict(zip(self.columns, values))
+
+    def toFrame(self) -> pd.DataFrame:
+        """Builds a dataframe of the current window, copied so later bars do not change it"""
+        return pd.DataFrame(
+            self._data[:, self.head : self.head + self.size].T.copy(),
+            index=pd.DatetimeIndex(self.times.copy().view("datetime64[ns]")),
+            columns=self.columns,
+        )
+
+
+def fromDatadict(dat: dict) -> dict:
+    """Creates a ring buffer for every dataset in a datadict, sized to the current window
+
+    Args:
+        dat (dict): datadict in default format
+
+    Returns:
+        dict: dataset name -> RingBuffer
+    """
+    return {key: RingBuffer.fromFrame(P) for key, P in dat.items()}
+
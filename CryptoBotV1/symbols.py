@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+import threading
+import logging
+
+from extraction import transport
+
+log = logging.getLogger("bot")
+
+
+def decimals(step: str) -> int:
+    """Number of decimals of a step size string like "0.00100000" """
+    return max(0, -Decimal(step).normalize().as_tuple().exponent)
+
+
+class SymbolMeta:
+    """Exchange filters of a symbol indexed by filter type, with the values needed for orders precomputed"""
+
+    def __init__(self, info: dict) -> None:
+        self.symbol = info["symbol"]
+        self.filters = {f["filterType"]: f for f in info["filters"]}
+
+        lotSize = self.filters["LOT_SIZE"]
+        self.stepSize = float(lotSize["stepSize"])
+        self.minQty = float(lotSize["minQty"])
+        self.precision = decimals(lotSize["stepSize"])
+
+        priceFilter = self.filters.get("PRICE_FILTER", {"tickSize": "0.00000001"})
+        self.tickSize = float(priceFilter["tickSize"])
+        self.pricePrecision = decimals(priceFilter["tickSize"])
+
+        notional = self.filters.get("MIN_NOTIONAL", self.filters.get("NOTIONAL", {}))
+        self.minNotional = float(notional.get("minNotional", 0))
+
+
+class SymbolCache:
+    """Symbol metadata of the whole exchange loaded with one exchange info call.
+    Reloaded in the background once ttl has passed, lookups never wait for a reload.
+    """
+
+    def __init__(self, client, ttl: timedelta = timedelta(hours=1)) -> None:
+        self.client = client
+        self.ttl = ttl
+        self.symbols = {}
+        self.loadedAt = None
+        self.reloading = False
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        info = self.client.get_exchange_info()
+        symbols = {s["symbol"]: SymbolMeta(s) for s in info["symbols"]}
+        with self.lock:
+            self.symbols = symbols
+            self.loadedAt = datetime.now()
+        log.debug(f"Loaded exchange info for {len(symbols)} symbols")
+
+    @property
+    def stale(self) -> bool:
+        return datetime.now() - self.loadedAt > self.ttl
+
+    def refreshIfStale(self):
+        """Starts a background reload once ttl has passed, meant for the 1m bar tick"""
+        with self.lock:
+            if self.reloading or not self.stale:
+                return
+            self.reloading = True
+        threading.Thread(target=self._reload, daemon=True).start()
+
+    def _reload(self):
+        try:
+            self.load()
+        except Exception as e:
+            # the old metadata stays in use, the next tick tries again
+            log.warning(f"Exchange info reload failed: {e}")
+        finally:
+            with self.lock:
+                self.reloading = False
+
+    def loadSymbol(self, ticker: str) -> SymbolMeta:
+        """Loads a single symbol at critical priority, for tickers missing from the exchange info"""
+        info = transport.request("exchangeInfo", {"symbol": ticker}, weight=20, priority=transport.CRITICAL)
+        meta = SymbolMeta(info["symbols"][0])
+        with self.lock:
+            self.symbols = {**self.symbols, ticker: meta}
+        return meta
+
+    def get(self, ticker: str) -> SymbolMeta:
+        """Metadata of a symbol, possibly up to one reload old. Unknown tickers are loaded on their own.
+
+        Args:
+            ticker (str): ticker i.e.: XLMBTC
+
+        Returns:
+            SymbolMeta: symbol metadata
+        """
+        meta = self.symbols.get(ticker)
+        return meta if meta is not None else self.loadSymbol(ticker)
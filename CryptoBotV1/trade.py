@@ -1,19 +1,24 @@
-import requests
-import math
-import pandas as pd
-from datetime import datetime, timedelta
+import numpy as np
 from binance.exceptions import BinanceAPIException
 from time import sleep
 import logging
 
+from extraction import transport
+from .misc import TradeFail
+from .orderbook import findLevelArrays
+from .orders import finalStatuses
+from .symbols import SymbolMeta
+
 log = logging.getLogger("bot")
 
 
-def getOrderBook(symbol: str, limit: int = 100):
-    r = requests.get(
-        f"https://api.binance.com/api/v3/depth?symbol={symbol}&limit={limit}"
+def getOrderBook(symbol: str, limit: int = 100, priority: int = transport.CRITICAL):
+    return transport.request(
+        "depth",
+        {"symbol": symbol, "limit": limit},
+        weight=transport.depthWeight(limit),
+        priority=priority,
     )
-    return r.json()
 
 
 def getTradeFee(client, summary: bool = False) -> float:
@@ -40,6 +45,7 @@ def sellOrder(
     quantity: float,
     market: bool = False,
     price=None,
+    symbols=None,
 ):
     """Create sell order
 
@@ -49,21 +55,20 @@ def sellOrder(
         base (str, optional): the base currency like BTC. Defaults to base.
         market (bool, optional): if true performs a market trade, otherwise limit. Defaults to True.
         price (float, optional): price to sell at for limit sales. Defaults to None.
+        symbols (symbols.SymbolCache, optional): cached symbol metadata. Defaults to None.
     """
     assert portfolio is not None, "No portfolio data given"
     assert portfolio.bought, "Sell order failed: already sold"
 
     priceOriginal = price
-    
-    info = client.get_symbol_info(ticker)
-    step_size = float(info["filters"][2]["stepSize"])
-    minQty = float(info["filters"][2]["minQty"])
-    precision = int(round(-math.log(step_size, 10), 0))
-    
-    quantity = "{:0.0{}f}".format(float(quantity), precision)
+
+    meta = symbols.get(ticker) if symbols is not None else SymbolMeta(client.get_symbol_info(ticker))
+
+    quantity = "{:0.0{}f}".format(float(quantity), meta.precision)
     price = "{:0.0{}f}".format(float(price), 8)
-    
-    assert float(quantity) > minQty, "Sell quantity too low"
+
+    assert float(quantity) > meta.minQty, "Sell quantity too low"
+    assert float(quantity) * float(price) >= meta.minNotional, "Sell value below min notional"
     assert (
         abs(float(price) / priceOriginal) - 1 < 0.001
     ), "Price precision error: price > 0.1percent diff"
@@ -93,6 +98,7 @@ def buyOrder(
     quantity: float,
     market: bool = False,
     price=None,
+    symbols=None,
 ):
     """Create buy order
 
@@ -102,20 +108,19 @@ def buyOrder(
         base (str, optional): the base currency like BTC. Defaults to base.
         market (bool, optional): if true performs a market trade, otherwise limit. Defaults to True.
         price (float, optional): price to buy at for limit sales. Defaults to None.
+        symbols (symbols.SymbolCache, optional): cached symbol metadata. Defaults to None.
     """
     assert portfolio is not None, "No portfolio data given"
     assert not portfolio.bought, "Buy order failed: already bought"
 
     priceOriginal = price
-    info = client.get_symbol_info(ticker)
-    step_size = float(info["filters"][2]["stepSize"])
-    minQty = float(info["filters"][2]["minQty"])
-    precision = int(round(-math.log(step_size, 10), 0))
+    meta = symbols.get(ticker) if symbols is not None else SymbolMeta(client.get_symbol_info(ticker))
 
-    quantity = "{:0.0{}f}".format(float(quantity) / float(price), precision)
+    quantity = "{:0.0{}f}".format(float(quantity) / float(price), meta.precision)
     price = "{:0.0{}f}".format(float(price), 8)
 
-    assert float(quantity) > minQty, "Buy quantity too low"
+    assert float(quantity) > meta.minQty, "Buy quantity too low"
+    assert float(quantity) * float(price) >= meta.minNotional, "Buy value below min notional"
     assert (
         abs(float(price) / priceOriginal) - 1 < 0.001
     ), "Price precision error: price > 0.1percent diff"
@@ -137,14 +142,16 @@ def buyOrder(
     return order
 
 
-def findLevel(pricesWS, buying: bool, ticker: str, amount: float) -> float:
-    """Finds buy price for limit order. Works for buying and selling. Performance: ~550-650 ms
+def findLevel(pricesWS, buying: bool, ticker: str, amount: float, books=None) -> float:
+    """Finds buy price for limit order. Works for buying and selling.
+    Performance: microseconds with a synced local order book, ~300 ms REST fallback otherwise
 
     Args:
         buying (bool): Are you buying or selling
         ticker (str): ticker i.e.: XLMBTC
         price (float): price of coin
         amount (float): amount of coin in portfolio
+        books (orderbook.OrderBooks, optional): local order books. Defaults to None.
 
     Returns:
         (float): price to set limit order at
@@ -152,59 +159,103 @@ def findLevel(pricesWS, buying: bool, ticker: str, amount: float) -> float:
     amountMargin = 1.1
     maxLevels = 10
 
-    oBook = getOrderBook(ticker, maxLevels)  # 300 ms
+    book = books.get(ticker) if books is not None else None
+    if book is not None:
+        prices, qtys = book.levels(buying, maxLevels)
+    else:
+        oBook = getOrderBook(ticker, maxLevels)  # 300 ms
+        levels = np.array(oBook["asks" if buying else "bids"], dtype=float).reshape(-1, 2)
+        prices, qtys = levels[:, 0], levels[:, 1]
 
     currentPrice = float(pricesWS.liveData[ticker])
 
-    if buying:
-        asks = pd.DataFrame(oBook["asks"], dtype=float)
+    # asks are summed in basecoin, bids in tradecoin
+    level = findLevelArrays(prices, qtys, amountMargin * amount, currentPrice if buying else 1.0)
+    if level is None:
+        raise TradeFail(f"Order book too thin for {amount} {ticker}")
+    levelPrice, avgPrice = level
 
-        asks["sum"] = asks.iloc[:, 1].cumsum() * currentPrice  # in basecoin
-        asks["wavg"] = (asks.iloc[:, 1] * asks.iloc[:, 0]).cumsum() / asks.iloc[
-            :, 1
-        ].cumsum()
+    loss = round(avgPrice / currentPrice * 100 - 100, 3)
+    if abs(loss) > 0.05:
+        log.info(
+            f"Slip Loss = {loss}%, currentPrice = {currentPrice}, avgPrice = {round(avgPrice,8)}, levelPrice = {levelPrice}"
+        )
 
-        BuyPrice = (asks[asks["sum"] > amountMargin * amount].iloc[0, :])[0]
-        avgBuyPrice = (asks[asks["sum"] > amountMargin * amount].iloc[0, :])["wavg"]
+    return levelPrice, abs(loss)
 
-        loss = round(avgBuyPrice / currentPrice * 100 - 100, 3)
-        if abs(loss) > 0.05:
-            log.info(
-                f"Slip Loss = {loss}%, currentPrice = {currentPrice}, avgBuyPrice = {round(avgBuyPrice,8)}, BuyPrice = {BuyPrice}"
-            )
 
-        return BuyPrice, abs(loss)
+def awaitOrder(client, portfolio, ticker: str, orderID: int, maxTradeTime: float):
+    """Waits until an order fills and cancels it once maxTradeTime has passed.
+    Uses the execution reports of the portfolio's user data stream, polls the order otherwise.
+
+    Args:
+        ticker (str): ticker i.e.: XLMBTC
+        orderID (int): order id
+        maxTradeTime (float): seconds before the order is cancelled
+
+    Returns:
+        (str, float): final order status and executed quantity
+    """
+    tracker = portfolio.orders if portfolio.stream else None
+
+    if tracker is not None:
+        state = tracker.wait(orderID, maxTradeTime)
     else:
-        bids = pd.DataFrame(oBook["bids"], dtype=float)
+        sleep(maxTradeTime)
+        state = None
+    if state is None:
+        order = client.get_order(symbol=ticker, orderId=orderID)
+        state = {"status": order["status"], "executedQty": float(order["executedQty"])}
 
-        bids["sum"] = bids.iloc[:, 1].cumsum()  # in tradecoin
-        bids["wavg"] = (bids.iloc[:, 1] * bids.iloc[:, 0]).cumsum() / bids.iloc[
-            :, 1
-        ].cumsum()
+    if state["status"] in finalStatuses:
+        return state["status"], state["executedQty"]
 
-        SP = (bids[bids["sum"] > amountMargin * amount].iloc[0, :])[0]
-        avgSP = (bids[bids["sum"] > amountMargin * amount].iloc[0, :])["wavg"]
+    try:
+        order = client.cancel_order(symbol=ticker, orderId=orderID)
+        return order["status"], float(order["executedQty"])
+    except BinanceAPIException as e:
+        # filled in the meantime
+        log.warning(f"Cancel failed: {e}")
 
-        loss = round(avgSP / currentPrice * 100 - 100, 3)
-        if abs(loss) > 0.05:
-            log.info(
-                f"Slip Loss = {loss}%, currentPrice = {currentPrice}, avgSP = {round(avgSP,5)}, SP = {SP}"
-            )
+    state = tracker.wait(orderID, 1.0) if tracker is not None else None
+    if state is None or state["status"] not in finalStatuses:
+        order = client.get_order(symbol=ticker, orderId=orderID)
+        state = {"status": order["status"], "executedQty": float(order["executedQty"])}
+    return state["status"], state["executedQty"]
 
-        return SP, abs(loss)
 
+def isDust(meta: SymbolMeta, quantity: float, price: float) -> bool:
+    """True if a quantity can't be sold: at most minQty or below minNotional once rounded to the lot size
 
-def tradesequence(client, pricesWS, buying, ticker, amount, portfolio):
+    Args:
+        meta (symbols.SymbolMeta): symbol metadata
+        quantity (float): amount of coin
+        price (float): price to sell at
+
+    Returns:
+        bool: quantity is below the symbol limits
+    """
+    quantity = float("{:0.0{}f}".format(float(quantity), meta.precision))
+    return quantity <= meta.minQty or quantity * price < meta.minNotional
+
+
+def tradesequence(client, pricesWS, buying, ticker, amount, portfolio, books=None, symbols=None):
     maxTradeTime = 2.0 # seconds
-    amount = amount * (0.999)
+    margin = 0.999
+    held = amount
+    amount = amount * margin
 
     if buying:
-        price, slipLoss = findLevel(pricesWS, buying, ticker, amount)
+        try:
+            price, slipLoss = findLevel(pricesWS, buying, ticker, amount, books)
+        except TradeFail as e:
+            log.error(e)
+            return False, None, None, None, "Thin book", 0
         amount = amount * (0.996)
 
         try:
             order = buyOrder(
-                client, portfolio, ticker, amount, market=False, price=price
+                client, portfolio, ticker, amount, market=False, price=price, symbols=symbols
             )
         except BinanceAPIException as e:
             if hasattr(e, "code"):
@@ -222,26 +273,29 @@ def tradesequence(client, pricesWS, buying, ticker, amount, portfolio):
                 log.error(e)
             return False, None, None, None, "Other Error", slipLoss
 
-        startTimeT = datetime.now()
         orderID = order["orderId"]
-        while (datetime.now() - startTimeT).seconds < maxTradeTime:
-            # FUTURE FEATURE LOOP FUNCTION
-            sleep(0.5)
-
-        if client.get_order(symbol=ticker, orderId=orderID)["status"] == "FILLED":
+        status, executedQty = awaitOrder(client, portfolio, ticker, orderID, maxTradeTime)
+        if status == "FILLED":
             return True, amount, price, orderID, False, slipLoss
+        elif executedQty > 0:
+            # the coins bought are held either way, so the buy counts
+            log.warning(f"Partial fill: {executedQty} {ticker}")
+            return True, executedQty, price, orderID, False, slipLoss
         else:
-            client.cancel_order(symbol=ticker, orderId=orderID)
             log.warning("Trade took too long")
-            return False, None, None, None, "Slow to trade", slipLoss
+            return False, None, None, orderID, "Slow to trade", slipLoss
 
     
     else:
-        price, slipLoss = findLevel(pricesWS, buying, ticker, amount)
+        try:
+            price, slipLoss = findLevel(pricesWS, buying, ticker, amount, books)
+        except TradeFail as e:
+            log.error(e)
+            return False, None, None, None, "Thin book", 0
 
         try:
             order = sellOrder(
-                client, portfolio, ticker, amount, market=False, price=price
+                client, portfolio, ticker, amount, market=False, price=price, symbols=symbols
             )
         except BinanceAPIException as e:
             if hasattr(e, "code"):
@@ -258,14 +312,21 @@ def tradesequence(client, pricesWS, buying, ticker, amount, portfolio):
                 log.error(e)
             return False, None, None, None, "Other Error", slipLoss
 
-        startTimeT = datetime.now()
         orderID = order["orderId"]
-        while (datetime.now() - startTimeT).seconds < maxTradeTime:
-            # FUTURE FEATURE LOOP FUNCTION
-            sleep(0.5)
-        if client.get_order(symbol=ticker, orderId=orderID)["status"] == "FILLED":
+        status, executedQty = awaitOrder(client, portfolio, ticker, orderID, maxTradeTime)
+        if status == "FILLED":
             return True, amount, price, orderID, False, slipLoss
+        elif executedQty > 0:
+            log.warning(f"Partial fill: {executedQty} {ticker}")
+            meta = symbols.get(ticker) if symbols is not None else SymbolMeta(client.get_symbol_info(ticker))
+            remainder = held - executedQty
+            if isDust(meta, remainder * margin, price):
+                # the remainder can never be sold, the position is closed
+                log.warning(f"Remainder {remainder} {ticker} below the symbol limits, left as dust")
+                portfolio.setDust(ticker[: -len(portfolio.base)], remainder)
+                return True, executedQty, price, orderID, False, slipLoss
+            # the remainder is still held and sold on the next pass
+            return False, None, None, orderID, "Partial fill", slipLoss
         else:
-            client.cancel_order(symbol=ticker, orderId=orderID)
             log.warning("Trade took too long")
-            return False, None, None, None, "Slow to trade", slipLoss
+            return False, None, None, orderID, "Slow to trade", slipLoss
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+from DiagnosticsV2.montecarlo import chunkElements, equityPaths, maxDrawdown
+
+methods = ["block", "stationary", "stratified"]
+
+
+def defaultBlockLength(n: int) -> int:
+    """Block length of about n^(1/3), the usual choice for block bootstraps"""
+    return max(1, int(round(n ** (1 / 3))))
+
+
+def blockIndices(n: int, nResamples: int, blockLength: int, rng) -> np.ndarray:
+    """Moving block bootstrap: consecutive blocks of blockLength trades from random starts,
+    wrapping around the end, so trades clustered in time stay together.
+
+    Returns:
+        np.ndarray: nResamples x n positions into the trade series
+    """
+    nBlocks = -(-n // blockLength)
+    starts = rng.integers(0, n, size=(nResamples, nBlocks))
+    indices = (starts[:, :, None] + np.arange(blockLength)) % n
+    return indices.reshape(nResamples, nBlocks * blockLength)[:, :n]
+
+
+def stationaryIndices(n: int, nResamples: int, blockLength: float, rng) -> np.ndarray:
+    """Stationary bootstrap (Politis and Romano): blocks of random, geometrically distributed
+    length with mean blockLength from random starts, wrapping around the end.
+
+    Returns:
+        np.ndarray: nResamples x n positions into the trade series
+    """
+    newBlock = rng.random((nResamples, n)) < 1 / blockLength
+    newBlock[:, 0] = True
+    starts = rng.integers(0, n, size=(nResamples, n))
+    # position where the block of every element started
+    steps = np.arange(n)
+    blockStart = np.maximum.accumulate(np.where(newBlock, steps, 0), axis=1)
+    return (np.take_along_axis(starts, blockStart, axis=1) + steps - blockStart) % n
+
+
+def stratifiedIndices(groups: np.ndarray, nResamples: int, rng) -> np.ndarray:
+    """Per group (ticker) resampling: every trade is replaced by a random trade of the same group,
+    so each resample keeps the ticker mix and the order in which tickers were traded.
+
+    Returns:
+        np.ndarray: nResamples x n positions into the trade series
+    """
+    indices = np.empty((nResamples, len(groups)), dtype=np.int64)
+    for group in np.unique(groups):
+        positions = np.flatnonzero(groups == group)
+        indices[:, positions] = positions[rng.integers(0, len(positions), size=(nResamples, len(positions)))]
+    return indices
+
+
+def statistics(profits: np.ndarray, start: float = 100) -> dict:
+    """Total return (%), Tharp expectancy and max drawdown (%) of every row of a trade profit matrix"""
+    profits = np.atleast_2d(profits)
+    losses = np.where(profits < 0, profits, 0)
+    nLosses = (profits < 0).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # (winrate * avg win + lossrate * avg loss) / -avg loss
+        expectancy = np.where(nLosses > 0, profits.mean(axis=1) / (-losses.sum(axis=1) / nLosses), np.nan)
+    equity = equityPaths(profits, start)
+    return {
+        "totalReturn": (equity[:, -1] / start - 1) * 100,
+        "expectancy": expectancy,
+        "maxDrawdown": maxDrawdown(equity),
+    }
+
+
+def bootstrap(data: pd.DataFrame, method: str = "stationary", nResamples: int = 10000, blockLength: float = None, confidence: float = 0.95, seed=None) -> pd.DataFrame:
+    """Bootstrap confidence intervals of total return, Tharp expectancy and max drawdown from the
+    profits of the sells in a trade table (getTradeData or backtest output), in trade order.
+
+    Args:
+        data (pd.DataFrame): trade data with buying, profit and for stratified ticker columns
+        method (str, optional): "block", "stationary" or "stratified" (by ticker). Defaults to "stationary".
+        nResamples (int, optional): number of resamples. Defaults to 10000.
+        blockLength (float, optional): (mean) block length in trades. Defaults to about n^(1/3).
+        confidence (float, optional): confidence level of the intervals. Defaults to 0.95.
+        seed (int, optional): seed for reproducible runs. Defaults to None.
+
+    Raises:
+        ValueError: unknown method or no closed trades
+
+    Returns:
+        pd.DataFrame: per statistic the estimate on the data, mean and std of the resamples and the interval low/high
+    """
+    if method not in methods:
+        raise ValueError(f"Unknown bootstrap method: {method}, options: {methods}")
+    sells = data[data["buying"] == False]
+    sells = sells[pd.to_numeric(sells["profit"], errors="coerce").notna()]
+    profits = sells["profit"].to_numpy(dtype=float)
+    n = len(profits)
+    if n == 0:
+        raise ValueError("No closed trades to resample")
+    blockLength = blockLength or defaultBlockLength(n)
+    groups = sells["ticker"].to_numpy() if method == "stratified" else None
+
+    rng = np.random.default_rng(seed)
+    perChunk = max(1, chunkElements // n)
+    resampled = {}
+    for done in range(0, nResamples, perChunk):
+        size = min(perChunk, nResamples - done)
+        if method == "block":
+            indices = blockIndices(n, size, int(blockLength), rng)
+        elif method == "stationary":
+            indices = stationaryIndices(n, size, blockLength, rng)
+        else:
+            indices = stratifiedIndices(groups, size, rng)
+        for name, values in statistics(profits[indices]).items():
+            resampled.setdefault(name, []).append(values)
+
+    alpha = (1 - confidence) / 2
+    estimates = statistics(profits)
+    rows = {}
+    for name, parts in resampled.items():
+        values = np.concatenate(parts)
+        rows[name] = {
+            "estimate": estimates[name][0],
+            "mean": np.nanmean(values),
+            "std": np.nanstd(values),
+            "low": np.nanquantile(values, alpha),
+            "high": np.nanquantile(values, 1 - alpha),
+        }
+    return pd.DataFrame(rows).T
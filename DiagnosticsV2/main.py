@@ -15,39 +15,18 @@ from datetime import timedelta
 
 sys.path.append(".") # embarassing i know
 import extraction.extract as gd
+from extraction import features, resultcache, tradelog
 import BackTesterV3.main as m
+from DiagnosticsV2 import bootstrap, matching, montecarlo
 from strategies import ns
 from strategies import tradingview
 
 
 def getTradeData(dateStart=None, dateEnd=None, foldername="logData", base="BTC"):
-    tradeData = pd.DataFrame(
-        columns=[
-            "timestamp",
-            "close",
-            "buying",
-            "ticker",
-            "coinAmount",
-            "baseAmount",
-            "profit",
-            "timeHeld",
-            "strategy",
-            "failed",
-        ]
-    )
-    listOfFiles = glob(os.path.join(f"{foldername}/*0.csv"))
-    for u in listOfFiles:
-        P = pd.read_csv(u).iloc[:, 1::]
-        P["timestamp"] = pd.to_datetime(P["timestamp"])
-        tradeData = tradeData.append(P, ignore_index=True)
-
+    # logs are ingested once into a timestamp sorted store, only the date range is loaded
+    tradeData = tradelog.TradeLog(foldername).query(dateStart, dateEnd).drop(columns="source")
     tradeData = tradeData.drop_duplicates(subset=["timestamp", "close"])
 
-    if dateStart is not None:
-        tradeData = tradeData[tradeData["timestamp"] >= dateStart]
-    if dateEnd is not None:
-        tradeData = tradeData[tradeData["timestamp"] <= dateEnd]
-
     failedTrades = len(tradeData) - len(
         tradeData[tradeData["failed"].isin([False, "False"])]
     )
@@ -86,11 +65,15 @@ def runBacktester(
     startMargin=timedelta(0, 900 * 60, 0),
     saveFolder="DiagnosticsV2/temp",
     reset=False,
+    cacheFolder="DiagnosticsV2/cache",
+    cacheBytes=2 * 1024**3,
 ):
-    start = str((start - timedelta(0, start.second, start.microsecond) - startMargin))
-    end = str(end)
+    start = start - timedelta(0, start.second, start.microsecond) - startMargin
 
-    saveFileIndicator = f"{''.join(coins)}_{start.replace(' ','').replace('.','').replace(':','')}_{end}"[::3]
+    # full coins and dates so different runs never share a results file
+    saveFileIndicator = f"{'-'.join(coins)}{base}_{start:%Y%m%d%H%M}_{pd.Timestamp(end):%Y%m%d%H%M}_{''.join(timeRanges)}"
+    start = str(start)
+    end = str(end)
 
     keys = r"keys/keys.txt"
     client = gd.readKeys(keys)
@@ -108,6 +91,10 @@ def runBacktester(
     ]
     indicators15 = ["EMA40", "SLOPE1"]
     indicators1h = []
+    # strategies declaring features only get those, anything else is computed when read
+    featureSpecs = features.strategyFeatures(
+        {"1m": indicatorsDefault, "15m": indicators15, "1h": indicators1h}, buyStrat, sellStrat
+    )
 
     dat = gd.generateBTData(
         saveFileIndicator,
@@ -122,21 +109,33 @@ def runBacktester(
         True,
     )
 
-    dat = gd.genIndicatorsMultiple(dat, "1m", indicatorsDefault)
-    dat = gd.genIndicatorsMultiple(dat, "15m", indicators15)
-    dat = gd.genIndicatorsMultiple(dat, "1h", indicators1h)
-
-    if os.path.exists(f"{saveFolder}/BT_{saveFileIndicator}.csv") and not reset:
+    # entries are addressed by what they are computed from, a changed strategy, parameter,
+    # indicator or engine code misses
+    cache = resultcache.ResultCache(cacheFolder, cacheBytes)
+    featureKey = resultcache.makeKey(resultcache.hashData(dat), featureSpecs, resultcache.hashCode(gd.genIndicatorsMultiple))
+    cached = None if reset else cache.get("features", featureKey)
+    if cached is not None:
+        dat = cached
+    else:
+        for tf in ["1m", "15m", "1h"]:
+            gd.genIndicatorsMultiple(dat, tf, featureSpecs[tf], inplace=True)
+        cache.put("features", featureKey, dat)
+
+    params = {"baseAmount": baseAmount, "startTime": firstTrade, "sinkLimit": 6, "maxHold": 60}
+    tradeKey = resultcache.makeKey(
+        featureKey,
+        resultcache.hashStrategy(buyStrat),
+        resultcache.hashStrategy(sellStrat),
+        resultcache.hashCode(m.runStrategy),
+        params,
+    )
+    tradeData = None if reset else cache.get("trades", tradeKey)
+    if tradeData is not None:
         print("Backtester results have already been generated")
-        tradeData = pd.read_csv(f"{saveFolder}/BT_{saveFileIndicator}.csv").iloc[:, 1::]
-        tradeData["timestamp"] = pd.to_datetime(tradeData["timestamp"])
-        return dat, tradeData
     else:
         print(f"Generating BackTester results")
-        tradeData = m.runStrategy(
-            dat, coins, buyStrat, sellStrat, baseAmount=baseAmount, startTime=firstTrade, sinkLimit=6, maxHold=60
-        )
-        tradeData.to_csv(f"{saveFolder}/BT_{saveFileIndicator}.csv")
+        tradeData = m.runStrategy(dat, coins, buyStrat, sellStrat, **params)
+        cache.put("trades", tradeKey, tradeData)
 
     return dat, tradeData
 
@@ -225,41 +224,16 @@ def textSummary(realData, btData, failedTrades, start, end, backtester=False):
     print(f"Failed transactions: {failedTrades}/{len(realData)+failedTrades}")
     print(f"Total succesfull transactions: real = {len(realData)/2} backtester = {len(btData)/2}")
 
-    matchingBuys = 0
-    matchingSells = 0
-    loosematchingBuys = 0
-    loosematchingSells = 0
-    timeMatchingBuys = 0
-    timeMatchingSells = 0
-
     btsellData = btData[btData["buying"] == False]
     btbuyData = btData[btData["buying"] == True]
     realsellData = realData[realData["buying"] == False]
     realbuyData = realData[realData["buying"] == True]
 
-    for _, realTrade in realbuyData.iterrows():
-        for _, btTrade in btbuyData.iterrows():
-            if realTrade["ticker"] == btTrade["ticker"]:
-                if abs(realTrade["timestamp"] - btTrade["timestamp"]) < timedelta(0, 5 * 60, 0):
-                    matchingBuys += 1
-                    timeMatchingBuys += 1
-                if abs(realTrade["timestamp"] - btTrade["timestamp"]) < timedelta(0, 15 * 60, 0):
-                    loosematchingBuys += 1
-            else:
-                if abs(realTrade["timestamp"] - btTrade["timestamp"]) < timedelta(0, 5 * 60, 0):
-                    timeMatchingBuys += 1
-
-    for _, realTrade in realsellData.iterrows():
-        for _, btTrade in btsellData.iterrows():
-            if realTrade["ticker"] == btTrade["ticker"]:
-                if abs(realTrade["timestamp"] - btTrade["timestamp"]) < timedelta(0, 5 * 60, 0):
-                    matchingSells += 1
-                    timeMatchingSells += 1
-                if abs(realTrade["timestamp"] - btTrade["timestamp"]) < timedelta(0, 15 * 60, 0):
-                    loosematchingSells += 1
-            else:
-                if abs(realTrade["timestamp"] - btTrade["timestamp"]) < timedelta(0, 5 * 60, 0):
-                    timeMatchingSells += 1
+    # trade pairs of the same ticker within 15 mins, counted from sorted timestamps
+    matches = matching.matchTrades(realData, btData)
+    counts = matching.matchCounts(realData, btData, matches)
+    matchingBuys, loosematchingBuys, timeMatchingBuys = (counts["buy"][k] for k in ("match", "loose", "time"))
+    matchingSells, loosematchingSells, timeMatchingSells = (counts["sell"][k] for k in ("match", "loose", "time"))
 
     print(f"Matching buys (5 mins): {matchingBuys}({round(matchingBuys/len(realbuyData)*100,0)}% | {round(matchingBuys/len(btbuyData)*100,0)}%), loose matches(15 mins): {loosematchingBuys}")
     print(f"Matching sells (5 mins): {matchingSells}({round(matchingSells/len(realsellData)*100,0)}% | {round(matchingSells/len(btsellData)*100,0)}%), loose matches(15 mins): {loosematchingSells}\n")
@@ -381,101 +355,91 @@ def textSummary(realData, btData, failedTrades, start, end, backtester=False):
         f"Calculated APM (Real | Backtester): {round(btAPM,3)}% | {round(realAPM,3)}%"
     )
 
+    return matches
 
-def monteCarlo(data, nSims, name="Test", maxSteps=None):
-    data = data[data["buying"] == False]["profit"].dropna().tolist()
+
+def monteCarlo(data, nSims, name="Test", maxSteps=None, seed=None, workers=1, plot=True, plotPaths=100):
+    data = data[data["buying"] == False]["profit"].dropna().to_numpy(dtype=float)
     if maxSteps is None:
         maxSteps = len(data)
 
-    xList = [x for x in range(maxSteps + 1)]
-    stepsList = []
-    endResults = []
-    maxdrawDownList = []
-
-    fig, axs = plt.subplots(
-        1,
-        2,
-        sharey=True,
-        num=f"Monte Carlo {name}",
-        gridspec_kw={"width_ratios": [3, 1]},
+    # only a sample of the paths is kept for the plot
+    result = montecarlo.simulate(
+        data, nSims, maxSteps, seed=seed, workers=workers, keepPaths=plotPaths if plot else 0
     )
-    for _ in range(nSims):
-        steps = [100]
-        inDowntrend = True
-        downTrendStart = 100
-        simDrawDownList = []
-        for u in range(maxSteps):
-            result = ((random.choice(data) / 100) + 1) * steps[u]
-            steps.append(result)
-            if u == maxSteps - 1:
-                endResults.append(result)
-                simDrawDownList.append(steps[-1] - steps[-2])
-
-            if inDowntrend:
-                if steps[-2] < steps[-1]:
-                    simDrawDownList.append(steps[-2] - downTrendStart)
-                    inDowntrend = False
-                if u == maxSteps - 1:
-                    simDrawDownList.append(steps[-1] - downTrendStart)
-                    inDowntrend = False
-
-            if len(steps) > 2 and (steps[-2] > steps[-1] and steps[-3] < steps[-2]):
-                inDowntrend = True
-                downTrendStart = steps[-2]
-
-        maxdrawDownList.append(min(simDrawDownList))
-
-        axs[0].plot(xList, steps)
-        stepsList.append(steps)
-
-    maxGraphValue = max(endResults)
-    minGraphValue = min(endResults)
-    sampleMean = np.mean(endResults)
-    sampleSTD = np.std(endResults)
-    yNormDist = np.linspace(minGraphValue, maxGraphValue, 100)
-    xNormDist = ss.norm.pdf(yNormDist, sampleMean, sampleSTD)
-    thingy = np.linspace(0, np.max(xNormDist))
-    probofLoss = round(ss.norm.cdf(100, sampleMean, sampleSTD) * 100, 4)
-    medianProfit = np.median(endResults) - 100
-
-    axs[1].plot(xNormDist, yNormDist)
-
-    sigmaList = [
-        sampleMean + 2 * sampleSTD,
-        sampleMean + 1 * sampleSTD,
-        sampleMean,
-        sampleMean - 1 * sampleSTD,
-        sampleMean - 2 * sampleSTD,
-    ]
-
-    for u in sigmaList:
-        axs[1].plot(
-            thingy, [u for x in thingy], linewidth=3, linestyle="--", color="orange"
-        )
-        axs[0].plot(
-            xList, [u for x in xList], linewidth=3, linestyle="--", color="orange"
+    stats = montecarlo.summarize(result)
+    endResults = result["final"]
+    probofLoss = round(stats["probLoss"], 4)
+    medianProfit = stats["medianReturn"]
+
+    if plot:
+        fig, axs = plt.subplots(
+            1,
+            2,
+            sharey=True,
+            num=f"Monte Carlo {name}",
+            gridspec_kw={"width_ratios": [3, 1]},
         )
+        xList = np.arange(maxSteps + 1)
+        axs[0].plot(xList, result["paths"].T)
+
+        maxGraphValue = endResults.max()
+        minGraphValue = endResults.min()
+        sampleMean = np.mean(endResults)
+        sampleSTD = np.std(endResults)
+        yNormDist = np.linspace(minGraphValue, maxGraphValue, 100)
+        xNormDist = ss.norm.pdf(yNormDist, sampleMean, sampleSTD)
+        thingy = np.linspace(0, np.max(xNormDist))
+
+        axs[1].plot(xNormDist, yNormDist)
+
+        sigmaList = [
+            sampleMean + 2 * sampleSTD,
+            sampleMean + 1 * sampleSTD,
+            sampleMean,
+            sampleMean - 1 * sampleSTD,
+            sampleMean - 2 * sampleSTD,
+        ]
 
-    fig.suptitle(
-        f"Monte Carlo {name} | simulations = {nSims} | steps = {maxSteps} | Prob. of Loss = {probofLoss}% | Median profit: = {round(medianProfit, 2)}%"
-    )
-    axs[0].set_xlabel(f"Steps / trades (-)")
-    axs[1].set_xlabel(f"Probability (-)")
-    axs[0].set_ylabel(f"Percentage of original (%)")
-    axs[0].grid()
-    axs[1].grid()
+        for u in sigmaList:
+            axs[1].plot(
+                thingy, [u for x in thingy], linewidth=3, linestyle="--", color="orange"
+            )
+            axs[0].plot(
+                xList, [u for x in xList], linewidth=3, linestyle="--", color="orange"
+            )
 
-    medianMaxDrawDown = np.median(maxdrawDownList)
-    medianReturn = np.median(endResults) - 100
+        fig.suptitle(
+            f"Monte Carlo {name} | simulations = {nSims} (showing {len(result['paths'])}) | steps = {maxSteps} | Prob. of Loss = {probofLoss}% | Median profit: = {round(medianProfit, 2)}%"
+        )
+        axs[0].set_xlabel(f"Steps / trades (-)")
+        axs[1].set_xlabel(f"Probability (-)")
+        axs[0].set_ylabel(f"Percentage of original (%)")
+        axs[0].grid()
+        axs[1].grid()
 
     print(f"==== Monte Carlo Analysis for {name} ====")
     print(f"Probability of loss: {probofLoss}%")
-    print(f"Median max drawdown: {round(medianMaxDrawDown,4)}%")
-    print(f"Absolute Max drawdown: {round(max(maxdrawDownList),4)}%")
-    print(f"Median return: {round(medianReturn,4)}%")
-    print(f"Median Return/Drawdown: {round(-medianReturn/medianMaxDrawDown,4)}")
+    print(f"Median max drawdown: {round(stats['medianMaxDrawdown'],4)}%")
+    print(f"Absolute Max drawdown: {round(stats['worstDrawdown'],4)}%")
+    print(f"Median return: {round(stats['medianReturn'],4)}%")
+    print(f"Median Return/Drawdown: {round(stats['returnToDrawdown'],4)}")
+    q = stats["returnQuantiles"]
+    print(f"Return 5% | 50% | 95% quantiles: {round(q[0.05],4)}% | {round(q[0.5],4)}% | {round(q[0.95],4)}%")
+    print(f"=============================================")
+    print("\n")
+    return stats
+
+
+def bootstrapSummary(data, name="Test", method="stationary", nResamples=10000, confidence=0.95, seed=None):
+    # trades are clustered in time, block resampling keeps that in the intervals unlike monteCarlo
+    result = bootstrap.bootstrap(data, method, nResamples, confidence=confidence, seed=seed)
+    print(f"==== Bootstrap ({method}, {nResamples} resamples, {confidence*100}% CI) for {name} ====")
+    print(result.round(4).to_string())
     print(f"=============================================")
     print("\n")
+    return result
+
 
 def plotBoughtInMatrix(coins, realData, btData):
     fig, axs = plt.subplots(1, 1, sharex=True, num=f"BoughtInMatrix")
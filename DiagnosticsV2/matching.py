@@ -0,0 +1,112 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from extraction.alignment import timesNs
+
+matchWindow = timedelta(minutes=5)
+looseWindow = timedelta(minutes=15)
+
+
+def _ns(window: timedelta) -> int:
+    return int(window / timedelta(microseconds=1)) * 1000
+
+
+def _times(trades: pd.DataFrame) -> np.ndarray:
+    return timesNs(pd.DatetimeIndex(pd.to_datetime(trades["timestamp"])))
+
+
+def windowBounds(times: np.ndarray, sortedTimes: np.ndarray, window: timedelta):
+    """For every time the [lo, hi) positions of sortedTimes strictly less than window away"""
+    w = _ns(window)
+    return (
+        np.searchsorted(sortedTimes, times - w, side="right"),
+        np.searchsorted(sortedTimes, times + w, side="left"),
+    )
+
+
+def countPairs(times: np.ndarray, otherTimes: np.ndarray, window: timedelta) -> int:
+    """Number of (time, other time) pairs less than window apart"""
+    lo, hi = windowBounds(times, np.sort(otherTimes), window)
+    return int((hi - lo).sum())
+
+
+def matchTrades(realData: pd.DataFrame, btData: pd.DataFrame, window: timedelta = looseWindow) -> pd.DataFrame:
+    """Pairs of real and backtested trades of the same ticker and side less than window apart,
+    found per ticker with searchsorted on sorted timestamps.
+
+    Args:
+        realData (pd.DataFrame): real trades, getTradeData format
+        btData (pd.DataFrame): backtested trades, runStrategy format
+        window (timedelta, optional): max time apart. Defaults to 15 minutes.
+
+    Returns:
+        pd.DataFrame: one row per pair: side, ticker, real and bt index labels, times, closes,
+            timeDelta and priceDelta (bt - real), priceDeltaPct and nearest (closest bt trade of that real trade)
+    """
+    parts = []
+    for buying, side in ((True, "buy"), (False, "sell")):
+        real = realData[realData["buying"] == buying]
+        bt = btData[btData["buying"] == buying]
+        btByTicker = {ticker: group for ticker, group in bt.groupby("ticker")}
+        for ticker, realGroup in real.groupby("ticker"):
+            btGroup = btByTicker.get(ticker)
+            if btGroup is None:
+                continue
+            btTimes = _times(btGroup)
+            order = np.argsort(btTimes, kind="stable")
+            realTimes = _times(realGroup)
+
+            lo, hi = windowBounds(realTimes, btTimes[order], window)
+            counts = hi - lo
+            realPos = np.repeat(np.arange(len(realGroup)), counts)
+            # positions lo[i] .. hi[i]-1 for every real trade i
+            btPos = order[np.repeat(lo - np.cumsum(np.r_[0, counts[:-1]]), counts) + np.arange(counts.sum())]
+            parts.append(pd.DataFrame({
+                "side": side,
+                "ticker": ticker,
+                "realIndex": realGroup.index.values[realPos],
+                "btIndex": btGroup.index.values[btPos],
+                "realTime": realTimes[realPos].view("datetime64[ns]"),
+                "btTime": btTimes[btPos].view("datetime64[ns]"),
+                "realClose": realGroup["close"].to_numpy(dtype=float)[realPos],
+                "btClose": btGroup["close"].to_numpy(dtype=float)[btPos],
+            }))
+
+    columns = ["side", "ticker", "realIndex", "btIndex", "realTime", "btTime", "realClose", "btClose"]
+    pairs = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=columns)
+    pairs["timeDelta"] = pd.to_timedelta(pairs["btTime"] - pairs["realTime"])
+    pairs["priceDelta"] = pairs["btClose"] - pairs["realClose"]
+    pairs["priceDeltaPct"] = pairs["priceDelta"] / pairs["realClose"] * 100
+    absDelta = pairs["timeDelta"].abs()
+    pairs["nearest"] = absDelta.eq(absDelta.groupby([pairs["side"], pairs["realIndex"]]).transform("min"))
+    return pairs
+
+
+def matchCounts(realData: pd.DataFrame, btData: pd.DataFrame, pairs: pd.DataFrame = None) -> dict:
+    """Pair counts textSummary reports, per side:
+    match (same ticker, < 5 min), loose (same ticker, < 15 min) and time (any ticker, < 5 min)
+
+    Args:
+        realData (pd.DataFrame): real trades
+        btData (pd.DataFrame): backtested trades
+        pairs (pd.DataFrame, optional): matchTrades output with a window of at least 15 minutes. Defaults to computing it.
+
+    Returns:
+        dict: {"buy": {"match", "loose", "time"}, "sell": {...}}
+    """
+    if pairs is None:
+        pairs = matchTrades(realData, btData, looseWindow)
+    counts = {}
+    for buying, side in ((True, "buy"), (False, "sell")):
+        sidePairs = pairs[pairs["side"] == side]
+        delta = sidePairs["timeDelta"].abs()
+        counts[side] = {
+            "match": int((delta < matchWindow).sum()),
+            "loose": int((delta < looseWindow).sum()),
+            "time": countPairs(
+                _times(realData[realData["buying"] == buying]), _times(btData[btData["buying"] == buying]), matchWindow
+            ),
+        }
+    return counts
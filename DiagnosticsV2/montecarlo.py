@@ -0,0 +1,96 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# resample matrix elements per chunk, bounds memory at about 8 bytes * 3 times this
+chunkElements = 4_000_000
+quantiles = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+
+def maxDrawdown(equity: np.ndarray) -> np.ndarray:
+    """Largest drop below the running peak of every row of an equity matrix, in %"""
+    peaks = np.maximum.accumulate(equity, axis=1)
+    return ((peaks - equity) / peaks).max(axis=1) * 100
+
+
+def equityPaths(profits: np.ndarray, start: float = 100) -> np.ndarray:
+    """Compounded equity of every row of a trade profit (%) matrix, with the start as first column"""
+    equity = np.empty((profits.shape[0], profits.shape[1] + 1))
+    equity[:, 0] = start
+    np.cumprod(1 + profits / 100, axis=1, out=equity[:, 1:])
+    equity[:, 1:] *= start
+    return equity
+
+
+def _chunk(profits: np.ndarray, nSims: int, steps: int, seed, start: float, keepPaths: int) -> dict:
+    rng = np.random.default_rng(seed)
+    equity = equityPaths(profits[rng.integers(0, len(profits), size=(nSims, steps))], start)
+    return {
+        "final": equity[:, -1].copy(),
+        "maxDrawdown": maxDrawdown(equity),
+        "paths": equity[:keepPaths].copy(),
+    }
+
+
+def simulate(profits, nSims: int, steps: int = None, seed=None, workers: int = 1, start: float = 100, keepPaths: int = 0) -> dict:
+    """Monte Carlo of compounded trade returns: every path draws steps trade profits with replacement.
+
+    Paths are simulated in chunks of a (paths x steps) resample matrix, every chunk gets its own
+    child seed of seed, so results are the same for any number of workers.
+
+    Args:
+        profits (array like): trade profits in %
+        nSims (int): number of paths
+        steps (int, optional): trades per path. Defaults to the number of profits.
+        seed (int, optional): seed for reproducible runs. Defaults to None.
+        workers (int, optional): processes to spread the chunks over. Defaults to 1.
+        start (float, optional): starting equity. Defaults to 100.
+        keepPaths (int, optional): equity paths to keep for plotting. Defaults to 0.
+
+    Returns:
+        dict: final equity and maxDrawdown (% below the running peak) per path, paths (keepPaths x steps+1)
+    """
+    profits = np.asarray(profits, dtype=float)
+    profits = profits[~np.isnan(profits)]
+    if len(profits) == 0:
+        raise ValueError("No trade profits to resample")
+    steps = steps or len(profits)
+
+    perChunk = max(1, chunkElements // steps)
+    sizes = [min(perChunk, nSims - i) for i in range(0, nSims, perChunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    keep = [min(keepPaths, size) if i == 0 else 0 for i, size in enumerate(sizes)]
+    args = [(profits, size, steps, s, start, k) for size, s, k in zip(sizes, seeds, keep)]
+
+    if workers > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            parts = list(pool.map(_chunk, *zip(*args)))
+    else:
+        parts = [_chunk(*a) for a in args]
+
+    return {
+        "final": np.concatenate([p["final"] for p in parts]),
+        "maxDrawdown": np.concatenate([p["maxDrawdown"] for p in parts]),
+        "paths": parts[0]["paths"],
+    }
+
+
+def summarize(result: dict, start: float = 100) -> dict:
+    """Risk numbers of a simulate result
+
+    Returns:
+        dict: probLoss (%), medianReturn (%), return quantiles (%), medianMaxDrawdown and worstDrawdown
+            (% below peak) and returnToDrawdown (median return / median max drawdown)
+    """
+    returns = (result["final"] / start - 1) * 100
+    drawdowns = result["maxDrawdown"]
+    medianReturn = np.median(returns)
+    medianDrawdown = np.median(drawdowns)
+    return {
+        "probLoss": (returns < 0).mean() * 100,
+        "medianReturn": medianReturn,
+        "returnQuantiles": dict(zip(quantiles, np.quantile(returns, quantiles))),
+        "medianMaxDrawdown": medianDrawdown,
+        "worstDrawdown": drawdowns.max(),
+        "returnToDrawdown": medianReturn / medianDrawdown if medianDrawdown > 0 else np.inf,
+    }
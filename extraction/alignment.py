@@ -0,0 +1,103 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+import extraction.generalValues as gv
+
+log = logging.getLogger("bot")
+
+
+def timesNs(index: pd.DatetimeIndex) -> np.ndarray:
+    """Datetime index as int64 nanoseconds"""
+    return np.asarray(index.values.astype("datetime64[ns]")).view("int64")
+
+
+def alignIndex(times: np.ndarray, higherTimes: np.ndarray, interval: str) -> np.ndarray:
+    """Position of the bar of a series each base time falls in: the last bar labeled at or before the
+    base time floored to the interval, -1 before the first bar. A missing bar gives the one before it,
+    never a later one, so gaps cannot leak future data.
+
+    Args:
+        times (np.ndarray): base times in ns
+        higherTimes (np.ndarray): bar times of the series in ns, sorted
+        interval (str): interval of the series, 1m 15m etc
+
+    Returns:
+        np.ndarray: int64 positions into higherTimes
+    """
+    step = gv.intervalMs[interval] * 10**6
+    return np.searchsorted(higherTimes, times - times % step, side="right") - 1
+
+
+class Alignment:
+    """Positions of the series of a datadict on one base timeline, computed once with searchsorted.
+
+    positions[key][i] is the bar of series key current at base bar i, so the backtester and the
+    live bot read every series by integer position instead of matching timestamps per bar.
+    Gaps inside a series and base bars whose bar a series lacks are collected in issues.
+    """
+
+    def __init__(self, dat: dict, keys: list, times: np.ndarray = None) -> None:
+        self.times = times if times is not None else timesNs(dat[keys[0]].index)
+        self.positions = {}
+        self.issues = []
+
+        for key in keys:
+            interval = key.split("_")[-1]
+            step = gv.intervalMs[interval] * 10**6
+            series = timesNs(dat[key].index)
+            positions = alignIndex(self.times, series, interval)
+            self.positions[key] = positions
+
+            gaps = np.flatnonzero(np.diff(series) > step)
+            if len(gaps):
+                self._issue(key, "gaps", len(gaps), series[gaps[0]])
+
+            target = self.times - self.times % step
+            late = positions < 0
+            early = (target > series[-1]) if len(series) else ~late
+            inexact = ~late & ~early & (series[np.maximum(positions, 0)] != target)
+            for kind, mask in (("starts late", late), ("ends early", early), ("missing bars", inexact)):
+                if mask.any():
+                    self._issue(key, kind, int(mask.sum()), self.times[np.argmax(mask)])
+
+    @classmethod
+    def fromDatadict(cls, dat: dict, coins: list, base: str = "BTC", lowestInterval: str = "1m", intervals: list = ("15m", "1h")):
+        """Alignment of every coin and timeframe on the lowest interval timeline of the first coin
+
+        Args:
+            dat (dict): datadict in default format
+            coins (list): coins, the first one sets the timeline
+            base (str, optional): pair. Defaults to "BTC".
+            lowestInterval (str, optional): timeline interval. Defaults to "1m".
+            intervals (list, optional): higher timeframes. Defaults to ("15m", "1h").
+
+        Returns:
+            Alignment: alignment with a positions array per datadict key
+        """
+        keys = [f"{coin}{base}_{tf}" for coin in coins for tf in [lowestInterval, *intervals]]
+        return cls(dat, keys)
+
+    def _issue(self, key: str, kind: str, count: int, first: int):
+        self.issues.append({"key": key, "kind": kind, "count": count, "first": pd.Timestamp(first)})
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        return self.positions[key]
+
+    @property
+    def ok(self) -> bool:
+        return not self.issues
+
+    def describe(self) -> list:
+        """One line per issue"""
+        return [
+            f"{issue['key']}: {issue['count']} {issue['kind']}, first at {issue['first']}"
+            for issue in self.issues
+        ]
+
+    def report(self) -> bool:
+        """Logs the issues as warnings, returns whether there are none"""
+        for line in self.describe():
+            log.warning(f"Alignment: {line}")
+        return self.ok
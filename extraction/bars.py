@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+import extraction.generalValues as gv
+
+
+def resampleKlines(klines, interval: str, startMs: int = None) -> pd.DataFrame:
+    """Aggregates raw 1m klines into klines of a higher interval.
+    Buckets are aligned on the epoch like the exchange's own bars.
+
+    Args:
+        klines (list or pd.DataFrame): raw 1m klines ordered by open time
+        interval (str): interval to build, "15m", "1h" etc
+        startMs (int, optional): buckets opening before this are dropped, they would be partial. Defaults to None.
+
+    Returns:
+        pd.DataFrame: raw klines of the interval with the columns of gv.klinesIndices
+    """
+    K = pd.DataFrame(klines, columns=gv.klinesIndices).astype(float).astype({"timestamp": "int64"})
+    size = gv.intervalMs[interval]
+
+    opens = K["timestamp"].values
+    buckets = opens // size * size
+    if startMs is not None:
+        keep = buckets >= startMs
+        K, opens, buckets = K[keep], opens[keep], buckets[keep]
+    if len(K) == 0:
+        return pd.DataFrame(columns=gv.klinesIndices)
+
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+
+    def col(name):
+        return K[name].values
+
+    out = pd.DataFrame({
+        "timestamp": buckets[starts],
+        "open": col("open")[starts],
+        "high": np.maximum.reduceat(col("high"), starts),
+        "low": np.minimum.reduceat(col("low"), starts),
+        "close": col("close")[ends],
+        "volume": np.add.reduceat(col("volume"), starts),
+        "close time": buckets[starts] + size - 1,
+        "quote asset volume": np.add.reduceat(col("quote asset volume"), starts),
+        "nTrades": np.add.reduceat(col("nTrades"), starts),
+        "?": np.add.reduceat(col("?"), starts),
+        "??": np.add.reduceat(col("??"), starts),
+        "???": col("???")[ends],
+    })
+    return out
+
+
+class BarBuilder:
+    """Builds higher timeframe bars of one symbol from its closed 1m bars as they arrive.
+    Buckets are aligned like the exchange's bars, so they match resampleKlines on the history.
+    """
+
+    def __init__(self, intervals: list, baseInterval: str = "1m") -> None:
+        self.baseMs = gv.intervalMs[baseInterval]
+        self.intervals = [i for i in intervals if gv.intervalMs[i] > self.baseMs]
+        self.current = {}
+        self.lastOpen = None
+
+    def add(self, openMs: int, bar: dict) -> list:
+        """Adds a closed base bar
+
+        Args:
+            openMs (int): open time of the bar in ms
+            bar (dict): open, high, low, close and volume
+
+        Returns:
+            list: (interval, bucket open time in ms, bar) for every bar this one completed
+        """
+        if self.lastOpen is not None and openMs <= self.lastOpen:
+            return []
+        self.lastOpen = openMs
+
+        done = []
+        for interval in self.intervals:
+            size = gv.intervalMs[interval]
+            bucket = openMs // size * size
+            current = self.current.pop(interval, None)
+
+            if current is not None and current[0] != bucket:
+                # the last bar of that bucket never arrived, close it anyway
+                done.append((interval, *current))
+                current = None
+
+            if current is None:
+                current = (bucket, dict(bar))
+            else:
+                agg = current[1]
+                agg["high"] = max(agg["high"], bar["high"])
+                agg["low"] = min(agg["low"], bar["low"])
+                agg["close"] = bar["close"]
+                agg["volume"] += bar["volume"]
+
+            if openMs + self.baseMs == bucket + size:
+                done.append((interval, *current))
+            else:
+                self.current[interval] = current
+        return done
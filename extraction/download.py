@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+import logging
+
+import pandas as pd
+from tqdm import tqdm as tqdm
+
+import extraction.generalValues as gv
+from extraction import transport
+
+log = logging.getLogger("bot")
+
+
+def toMilliseconds(date) -> int:
+    """datetime or date string (UTC if no timezone given, like python-binance) to epoch ms, ints are taken as ms"""
+    if isinstance(date, int):
+        return date
+    date = pd.Timestamp(date)
+    if date.tzinfo is None:
+        date = date.tz_localize("UTC")
+    return int(date.value // 1_000_000)
+
+
+def klineChunks(start, end, interval: str, limit: int = 1000) -> list:
+    """Splits a date range into page sized (startMs, endMs) ranges of at most limit klines
+
+    Args:
+        start (datetime): start date
+        end (datetime): end date, inclusive like get_historical_klines
+        interval (str): interval "1m", "1h" etc
+        limit (int, optional): klines per request. Defaults to 1000.
+
+    Returns:
+        list: (startMs, endMs) per page
+    """
+    startMs, endMs = toMilliseconds(start), toMilliseconds(end)
+    step = gv.intervalMs[interval] * limit
+    return [(s, min(s + step - 1, endMs)) for s in range(startMs, endMs + 1, step)]
+
+
+def fetchChunk(ticker: str, interval: str, startMs: int, endMs: int, retries: int = 5, limit: int = 1000) -> list:
+    """Downloads one page of klines, retrying with backoff
+
+    Returns:
+        list: raw klines
+    """
+    params = {"symbol": ticker, "interval": interval, "startTime": startMs, "endTime": endMs, "limit": limit}
+    for attempt in range(retries):
+        try:
+            return transport.request("klines", params, weight=2, priority=transport.BACKGROUND)
+        except Exception as e:
+            if attempt == retries - 1:
+                raise
+            log.warning(f"Kline download {ticker}_{interval} {startMs} failed ({e}), retrying")
+            time.sleep(2 ** attempt)
+
+
+def downloadRanges(ranges: list, workers: int = 8, progress: bool = True) -> dict:
+    """Downloads klines for several (ticker, interval, startMs, endMs) ranges at once.
+    Every range is split into pages which are fetched concurrently within the request weight budget.
+
+    Args:
+        ranges (list): list of (ticker, interval, startMs, endMs), end inclusive
+        workers (int, optional): number of concurrent requests. Defaults to 8.
+        progress (bool, optional): show a progress bar. Defaults to True.
+
+    Returns:
+        dict: range tuple -> raw klines in order
+    """
+    chunks = {
+        r: [(r[0], r[1], s, e) for s, e in klineChunks(r[2], r[3], r[1])]
+        for r in ranges
+    }
+
+    pages = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetchChunk, *chunk): chunk for rChunks in chunks.values() for chunk in rChunks}
+        for future in tqdm(as_completed(futures), total=len(futures), disable=not progress):
+            pages[futures[future]] = future.result()
+
+    return {r: [k for chunk in rChunks for k in pages[chunk]] for r, rChunks in chunks.items()}
+
+
+def downloadMany(tasks: list, start, end, workers: int = 8, progress: bool = True) -> dict:
+    """Downloads klines for several (ticker, interval) pairs over the same date range
+
+    Args:
+        tasks (list): list of (ticker, interval)
+        start (datetime): start date
+        end (datetime): end date
+        workers (int, optional): number of concurrent requests. Defaults to 8.
+        progress (bool, optional): show a progress bar. Defaults to True.
+
+    Returns:
+        dict: "{ticker}_{interval}" -> raw klines in order
+    """
+    startMs, endMs = toMilliseconds(start), toMilliseconds(end)
+    ranges = [(ticker, interval, startMs, endMs) for ticker, interval in tasks]
+    klines = downloadRanges(ranges, workers, progress)
+    return {f"{r[0]}_{r[1]}": klines[r] for r in ranges}
+
+
+def getHistoricalKlines(ticker: str, interval: str, start, end, workers: int = 8) -> list:
+    """Concurrent replacement of client.get_historical_klines
+
+    Returns:
+        list: raw klines in order
+    """
+    return downloadMany([(ticker, interval)], start, end, workers, progress=False)[f"{ticker}_{interval}"]
@@ -1,13 +1,13 @@
 import time
 from binance.client import Client
 from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
-import pandas_ta as ta
-from tqdm import tqdm as tqdm
-from copy import deepcopy
-import os
 
 import extraction.generalValues as gv
+from extraction import bars, download, marketcache
+from extraction import indicators as registry
+from extraction.panel import Panel
 
 
 def readKeys(keyfile: str, testnet: bool = False) -> Client:
@@ -26,34 +26,31 @@ def readKeys(keyfile: str, testnet: bool = False) -> Client:
     return client
 
 
-def getHistoricalData(
-    client, ticker: str, start: datetime, end: datetime, interval: str
-) -> pd.DataFrame:
-    """Retrieves historical data for single ticker from binance and returns it as a pandas dataframe
+def labelTimes(openMs):
+    """Timestamps used to index price data from kline open times in ms"""
+    return pd.to_datetime(openMs - (time.timezone * 2000), unit="ms")
+
+
+def openTimes(index: pd.DatetimeIndex) -> np.ndarray:
+    """Kline open times in ms from a price data index, inverse of labelTimes"""
+    return np.asarray(index, dtype="datetime64[ms]").astype("int64") + time.timezone * 2000
+
 
+def klinesToFrame(klines: list) -> pd.DataFrame:
+    """Turns raw binance klines into a price data dataframe
 
     Args:
-        client (binance.client.Client): binance client object from readKeys()
-        ticker (str): market ticker e.g. BNBUSDT
-        start (datetime): start date in datetime format: datetime(2022,1,1,...)
-        end (datetime): end date in datetime format: datetime(2022,1,1,...)
-        interval (str): interval to retrieve data for: "1m", "1d" etc see options in generalValues
+        klines (list): klines as returned by the klines endpoint
 
     Returns:
-        pd.DataFrame: _description_
+        pd.DataFrame: price data indexed by timestamp
     """
-    klines = client.get_historical_klines(ticker, interval, start, end)
-
     P = pd.DataFrame(klines, columns=gv.klinesIndices)
 
-    # convert interval to pandas standard for filling gaps
-    # pdInterval = interval.replace("m", "T").replace("h", "H")
-    # dates = pd.date_range(start=start, end=end, freq=pdInterval)
-
     # Drop unnecessary columns and handle datetime
     P = (
         P.drop(["quote asset volume", "close time", "?", "??", "???"], axis=1)
-        .assign(timestamp=lambda x: pd.to_datetime(x.timestamp-(time.timezone*2000), unit="ms"))
+        .assign(timestamp=lambda x: labelTimes(x.timestamp))
         .set_index("timestamp")
         .astype(float)
         # Handle missing dates
@@ -66,8 +63,35 @@ def getHistoricalData(
     return P
 
 
+def getHistoricalData(
+    client, ticker: str, start: datetime, end: datetime, interval: str
+) -> pd.DataFrame:
+    """Retrieves historical data for single ticker from binance and returns it as a pandas dataframe.
+    Pages are downloaded concurrently through the shared transport, klines are public so client is not used.
+
+
+    Args:
+        client (binance.client.Client): binance client object from readKeys()
+        ticker (str): market ticker e.g. BNBUSDT
+        start (datetime): start date in datetime format: datetime(2022,1,1,...)
+        end (datetime): end date in datetime format: datetime(2022,1,1,...)
+        interval (str): interval to retrieve data for: "1m", "1d" etc see options in generalValues
+
+    Returns:
+        pd.DataFrame: _description_
+    """
+    klines = download.getHistoricalKlines(ticker, interval, start, end)
+
+    # convert interval to pandas standard for filling gaps
+    # pdInterval = interval.replace("m", "T").replace("h", "H")
+    # dates = pd.date_range(start=start, end=end, freq=pdInterval)
+
+    return klinesToFrame(klines)
+
+
 def genIndicatorsFromList(P: pd.DataFrame, indicators: list) -> pd.DataFrame:
-    """Generates indicators from a list and adds them to the price data Dataframe
+    """Generates indicators from a list and adds them to the price data Dataframe.
+    Specs are parsed by the indicator registry, an unknown one raises before anything is computed.
 
     Args:
         P (DataFrame): price data Dataframe
@@ -76,51 +100,53 @@ def genIndicatorsFromList(P: pd.DataFrame, indicators: list) -> pd.DataFrame:
     Returns:
         P (DataFrame): The price data Dataframe with the various indicators added to it.
     """
-    for indicator in indicators:
-        if indicator == "MACD":
-            P.ta.macd(append=True)
-        elif indicator == "OBV":
-            P.ta.obv(append=True)
-        elif indicator[0:3] == "EMA":
-            length = int(indicator[3::])
-            P.ta.ema(length=length, append=True)
-        elif indicator[0:3] == "SMA":
-            length = int(indicator[3::])
-            P.ta.sma(length=length, append=True)
-        elif indicator[0:3] == "RSI":
-            length = int(indicator[3::])
-            P.ta.rsi(length=length, append=True)
-        elif indicator[0:6] == "BBANDS":
-            length = int(indicator[6::])
-            P.ta.bbands(length=length, append=True)
-        elif indicator[0:6] == "ZSCORE":
-            length = int(indicator[6::])
-            P.ta.zscore(length=length, append=True)
-        elif indicator[0:5] == "SLOPE":
-            length = int(indicator[5::])
-            P.ta.slope(length=length, append=True)
-        else:
-            print("Failure in adding indicator")
+    values = registry.compute(P, indicators)
+    for column in values.columns:
+        P[column] = values[column]
 
     return P
 
 
-def genIndicatorsMultiple(dat: dict, timeFrame: str, indicators: list) -> dict:
+def genIndicatorsMultiple(
+    dat: dict, timeFrame: str, indicators: list, inplace: bool = False, panel: bool = False
+) -> dict:
     """generate indicators for a datadict
 
+    Only the dataframes of the requested timeframe are touched, indicators are appended as new columns.
+    Without inplace the returned datadict shares every other dataframe with dat (copy on write).
+
     Args:
         dat (dict): datadict in default format
         timeFrame (str): timeframe 1m 15m etc
         indicators (list): list of indicators to add
+        inplace (bool, optional): add the columns to the dataframes in dat itself. Defaults to False.
+        panel (bool, optional): compute all coins at once on a time x symbol panel. Defaults to False.
 
     Returns:
         dict: datadict with indicators
     """
-    datTemp = deepcopy(dat)
-    for key in list(datTemp.keys()):
-        keyTimeframe = key.split("_")[1]
-        if keyTimeframe == timeFrame:
-            datTemp[key] = genIndicatorsFromList(datTemp[key], indicators)
+    # parse once so a bad spec fails even without data of this timeframe
+    indicators = registry.validate(indicators)
+    datTemp = dat if inplace else dict(dat)
+    keys = [key for key in datTemp.keys() if key.split("_")[1] == timeFrame]
+
+    if panel and keys:
+        pan = Panel.fromDatadict(datTemp, timeFrame)
+        pan.addIndicators(indicators)
+        columns = [column for indicator in indicators for column in indicator.columns]
+        for key in keys:
+            P = datTemp[key]
+            j = pan.position[key.split("_")[0]]
+            values = pd.DataFrame({column: pan.fields[column][:, j] for column in columns}, index=pan.index)
+            if not P.index.equals(pan.index):
+                values = values.reindex(P.index)
+            # one concat per coin instead of a column insert per indicator
+            datTemp[key] = pd.concat([P.drop(columns=P.columns.intersection(columns)), values], axis=1)
+        return datTemp
+
+    for key in keys:
+        P = datTemp[key] if inplace else datTemp[key].copy()
+        datTemp[key] = genIndicatorsFromList(P, indicators)
     return datTemp
 
 
@@ -135,67 +161,81 @@ def generateBTData(
     rootfolderName: str = "data",
     forceRegen: bool = False,
     save: bool = True,
+    backend: str = "npy",
+    resample: bool = True,
 ) -> dict:
-    """Genereates and returns date from binance API for Backtester
+    """Genereates and returns date from binance API for Backtester.
+    Saved data lives in one gap aware store per rootfolder, only ranges not stored yet are downloaded.
 
     Args:
-        dataSetName (str): name of dataset to save under.
+        dataSetName (str): name of the dataset, kept for compatibility, the store is shared by all datasets.
         folderName (str, optional): default save rootfolder. Defaults to "data".
+        forceRegen (bool, optional): download the whole range again. Defaults to False.
+        save (bool, optional): use the store, otherwise download without saving. Defaults to True.
+        backend (str, optional): storage format of the store, see extraction.storage. Defaults to "npy".
+        resample (bool, optional): only get 1m data and build the higher intervals from it. Defaults to True.
 
     Returns:
         dict: dictionary of all datasets.
     """
-    saveLocation = f"{rootfolderName}/{dataSetName}"
-
-    if not os.path.exists(saveLocation) and save:
-        os.makedirs(saveLocation)
-
+    if resample:
+        tasks = [(coin + pair, "1m") for coin in coins]
+    else:
+        tasks = [(coin + pair, interval) for coin in coins for interval in intervals]
+
+    if save:
+        store = marketcache.MarketStore(f"{rootfolderName}/market", backend)
+        klines = store.get(tasks, start, end, refresh=forceRegen)
+    else:
+        # all datasets are downloaded at once, page by page in parallel
+        klines = download.downloadMany(tasks, start, end)
+
+    startMs = download.toMilliseconds(start)
     dat = {}
-    for coin in tqdm(coins):
-        ticker = coin + pair
+    for coin in coins:
         for interval in intervals:
-            datID = f"{ticker}_{interval}"
-            if not os.path.exists(f"{saveLocation}/{datID}.csv") or forceRegen:
-                # print(f"\nGetting data for: {datID}:")
-                temp = getHistoricalData(client, ticker, start, end, interval)
-                if save:
-                    temp.to_csv(f"{saveLocation}/{datID}.csv")
-                dat[datID] = temp
+            datID = f"{coin + pair}_{interval}"
+            if resample and interval != "1m":
+                dat[datID] = klinesToFrame(bars.resampleKlines(klines[f"{coin + pair}_1m"], interval, startMs))
             else:
-                temp = pd.read_csv(
-                    f"{saveLocation}/{datID}.csv",
-                    header=0,
-                    index_col=0,
-                    parse_dates=[0],
-                )
-                temp = temp.assign(
-                    index=lambda x: pd.to_datetime(x.index)
-                )  # , format=dform))
-                dat[datID] = temp
+                dat[datID] = klinesToFrame(klines[datID])
     return dat
 
 
 def initBotData(
-    client, coins: list, intervals: list, pair: str, hours: int = 9
+    client, coins: list, intervals: list, pair: str, hours=9
 ) -> dict:
-    """wrapper of getHistorical to retrieve starting data for cryptobot
+    """wrapper of getHistorical to retrieve starting data for cryptobot.
+    Only 1m data is downloaded, higher intervals are built from it.
 
     Args:
         client (): binance client object
         coins (list): list of coins ["ICP","XLM"] etc
         intervals (list): list of intervals ["1m", "1h"] etc
         pair (str): pair to trade with BTC etc
-        hours (int, optional): hours of data to start with. Defaults to 9.
+        hours (int or dict, optional): hours of data to start with, or a dict of hours per interval. Defaults to 9.
 
     Returns:
         dict: _description_
     """
+    if not isinstance(hours, dict):
+        hours = {interval: hours for interval in intervals}
+
     end = datetime.utcnow().replace(microsecond=0, second=0)
-    start = end - timedelta(hours=hours)
+    start = end - timedelta(hours=max(hours.values()))
     print(start, end)
     dat = generateBTData(
         "cryptobot", client, coins, pair, intervals, str(start), str(end), save=False
     )
+
+    # cut every interval to its own window, buckets starting before it would be partial
+    for datID, P in dat.items():
+        interval = datID.split("_")[-1]
+        intervalStart = download.toMilliseconds(end - timedelta(hours=hours[interval]))
+        if interval != "1m":
+            size = gv.intervalMs[interval]
+            intervalStart = -(-intervalStart // size) * size
+        dat[datID] = P[P.index >= labelTimes(intervalStart)]
     return dat
 
 
@@ -0,0 +1,112 @@
+import pandas as pd
+
+from extraction import indicators as registry
+
+
+class FeatureFrame:
+    """Price dataframe whose indicator columns are computed the first time they are read.
+
+    Reading frame["EMA_40"] computes EMA40 through the indicator registry (sharing intermediates
+    with other lazily computed columns) and keeps it until update() brings a new bar.
+    Columns already in the price data are returned as they are. Other attributes (iloc, index,
+    tail, ...) go to a dataframe of the price data plus the columns computed so far, so row-wise
+    reads of an indicator need it to be read or prefetched first. Given a ring buffer instead of a
+    dataframe, the dataframe is only built when the data is read.
+    """
+
+    def __init__(self, P, features: list = None) -> None:
+        self.features = list(features) if features else []
+        self.update(P)
+
+    def update(self, P):
+        """New price data, drops every computed column. Takes a dataframe or a source with a toFrame()
+        method (like a ring buffer), which is only turned into a dataframe when the data is read.
+        The declared features are computed on that first read.
+        """
+        self.source = P
+        self._P = P if isinstance(P, pd.DataFrame) else None
+        self.computed = {}
+        self.context = None
+        self.joined = None
+        if self._P is not None and self.features:
+            self.prefetch(self.features)
+
+    @property
+    def P(self) -> pd.DataFrame:
+        """Price data, built from the source on first access"""
+        if self._P is None:
+            self._P = self.source.toFrame()
+            if self.features:
+                self.prefetch(self.features)
+        return self._P
+
+    def prefetch(self, specs: list):
+        """Computes the indicators of a list of specs like EMA40 in one go"""
+        for indicator in registry.validate(specs):
+            if not all(column in self for column in indicator.columns):
+                self._compute(indicator)
+
+    def _compute(self, indicator):
+        if self.context is None:
+            self.context = registry.BatchContext(self.P)
+        for column, values in zip(indicator.columns, indicator.compute(self.context)):
+            self.computed[column] = values
+        self.joined = None
+
+    def __contains__(self, column) -> bool:
+        return column in self.P.columns or column in self.computed
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key in self.P.columns:
+                return self.P[key]
+            if key not in self.computed:
+                self._compute(registry.indicatorForColumn(key))
+            return self.computed[key]
+        # list of columns
+        for column in key:
+            if column not in self:
+                self._compute(registry.indicatorForColumn(column))
+        return self.frame[key]
+
+    def __len__(self) -> int:
+        return len(self.source)
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """Price data with the columns computed so far"""
+        if not self.computed:
+            return self.P
+        if self.joined is None:
+            self.joined = pd.concat([self.P, pd.DataFrame(self.computed, index=self.P.index)], axis=1)
+        return self.joined
+
+    def __getattr__(self, name):
+        if name in ("_P", "source", "computed", "context", "joined", "features"):
+            raise AttributeError(name)
+        return getattr(self.frame, name)
+
+
+def strategyFeatures(defaults: dict, *strategies) -> dict:
+    """Indicator specs per timeframe declared by strategies through a `features` attribute,
+    e.g. buyStrat.features = {"1m": ["EMA40", "RSI14"], "15m": ["EMA40"]}.
+    An empty declaration means everything is computed lazily on access.
+
+    Args:
+        defaults (dict): timeframe -> specs, used when no strategy declares features
+        strategies: strategy functions
+
+    Returns:
+        dict: timeframe -> specs, union of the declarations
+    """
+    declared = [getattr(strategy, "features", None) for strategy in strategies]
+    declared = [d for d in declared if d is not None]
+    if not declared:
+        return {timeFrame: list(specs) for timeFrame, specs in defaults.items()}
+
+    features = {timeFrame: [] for timeFrame in defaults}
+    for d in declared:
+        for timeFrame, specs in d.items():
+            features.setdefault(timeFrame, [])
+            features[timeFrame] += [spec for spec in specs if spec not in features[timeFrame]]
+    return features
@@ -1,2 +1,19 @@
 klinesIndices = ["timestamp", "open", "high", "low",
-                     "close", "volume", "close time", "quote asset volume", "nTrades", "?", "??", "???"]
\ No newline at end of file
+                     "close", "volume", "close time", "quote asset volume", "nTrades", "?", "??", "???"]
+
+intervalMs = {
+    "1m": 60000,
+    "3m": 3 * 60000,
+    "5m": 5 * 60000,
+    "15m": 15 * 60000,
+    "30m": 30 * 60000,
+    "1h": 3600000,
+    "2h": 2 * 3600000,
+    "4h": 4 * 3600000,
+    "6h": 6 * 3600000,
+    "8h": 8 * 3600000,
+    "12h": 12 * 3600000,
+    "1d": 86400000,
+    "3d": 3 * 86400000,
+    "1w": 7 * 86400000,
+}
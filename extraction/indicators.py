@@ -0,0 +1,319 @@
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+from extraction import streaming
+
+# indicator name -> Indicator subclass, filled by @register
+registry = {}
+
+
+def register(cls):
+    """Class decorator adding an indicator to the registry under its name"""
+    if cls.name in registry:
+        raise ValueError(f"Indicator {cls.name} registered twice")
+    registry[cls.name] = cls
+    return cls
+
+
+def parse(spec: str):
+    """Parses an indicator spec like EMA40, MACD or BBANDS20
+
+    Args:
+        spec (str): indicator name followed by its length if it takes one
+
+    Raises:
+        ValueError: unknown indicator or wrong length
+
+    Returns:
+        Indicator: indicator instance
+    """
+    match = re.fullmatch(r"([A-Z]+)(\d*)", spec) if isinstance(spec, str) else None
+    if match is None or match.group(1) not in registry:
+        raise ValueError(f"Unknown indicator: {spec}, options: {sorted(registry)}")
+    cls = registry[match.group(1)]
+    length = int(match.group(2)) if match.group(2) else None
+    if cls.needsLength and not length:
+        raise ValueError(f"Indicator {spec} needs a length > 0, e.g. {cls.name}20")
+    if not cls.needsLength and length is not None:
+        raise ValueError(f"Indicator {cls.name} takes no length, got {spec}")
+    return cls(length) if cls.needsLength else cls()
+
+
+def validate(specs: list) -> list:
+    """Parses a list of specs once, duplicates removed, so invalid ones fail before any data is touched
+
+    Args:
+        specs (list): indicator specs like EMA40 or parsed Indicator instances
+
+    Returns:
+        list: Indicator instances in order
+    """
+    indicators = {}
+    for spec in specs:
+        indicator = spec if isinstance(spec, Indicator) else parse(spec)
+        indicators.setdefault(repr(indicator), indicator)
+    return list(indicators.values())
+
+
+def indicatorForColumn(column: str):
+    """The indicator producing an output column, e.g. EMA_40 -> EMA40 or BBU_20_2.0 -> BBANDS20
+
+    Raises:
+        KeyError: no registered indicator has this column
+    """
+    prefix, _, props = column.partition("_")
+    for cls in registry.values():
+        if prefix not in cls.prefixes:
+            continue
+        if not cls.needsLength:
+            indicator = cls()
+        elif props.split("_")[0].isdigit():
+            indicator = cls(int(props.split("_")[0]))
+        else:
+            continue
+        if column in indicator.columns:
+            return indicator
+    raise KeyError(column)
+
+
+def _ema(x: pd.Series, length: int) -> pd.Series:
+    # pandas_ta ema: sma of the first `length` values as seed, then ewm(span=length, adjust=False)
+    if len(x) < length:
+        return x * np.nan
+    x = x.copy()
+    seed = x.iloc[:length].mean()
+    x.iloc[: length - 1] = np.nan
+    x.iloc[length - 1] = seed
+    return x.ewm(span=length, adjust=False).mean()
+
+
+def _nonZeroRange(high: pd.Series, low: pd.Series) -> pd.Series:
+    # pandas_ta non_zero_range, per column for a panel
+    diff = high - low
+    return diff + sys.float_info.epsilon * diff.eq(0).any()
+
+
+class BatchContext:
+    """Intermediate series of one price frame (emas, rolling means/stds, diffs), each computed once
+    and shared by every indicator that needs it.
+    P can also map fields to time x symbol frames, see extraction.panel, then every column is one symbol.
+    """
+
+    def __init__(self, P) -> None:
+        self.P = P
+        self.cache = {}
+
+    def shared(self, key, make):
+        if key not in self.cache:
+            self.cache[key] = make()
+        return self.cache[key]
+
+    def series(self, source) -> pd.Series:
+        """A price column by name or a cached intermediate by key"""
+        return self.P[source] if isinstance(source, str) else self.cache[source]
+
+    def ema(self, length: int, source="close") -> pd.Series:
+        return self.shared(("ema", length, source), lambda: _ema(self.series(source), length))
+
+    def rollingMean(self, length: int) -> pd.Series:
+        return self.shared(("mean", length), lambda: self.P["close"].rolling(length, min_periods=length).mean())
+
+    def rollingStd(self, length: int, ddof: int) -> pd.Series:
+        return self.shared(
+            ("std", length, ddof), lambda: self.P["close"].rolling(length, min_periods=length).std(ddof=ddof)
+        )
+
+    def diff(self, length: int) -> pd.Series:
+        return self.shared(("diff", length), lambda: self.P["close"].diff(length))
+
+
+class Indicator:
+    """Base of the registered indicators. Values follow pandas_ta 0.3.14b so batch and stream agree.
+
+    Subclasses set name, needsLength, prefixes and columns and implement compute (whole frame, with a
+    BatchContext) and stream (a fresh streaming counterpart, see extraction.streaming).
+    """
+
+    name = None
+    needsLength = True
+    # column name prefixes (before the first "_") of the outputs
+    prefixes = []
+
+    def __init__(self, length: int = None) -> None:
+        self.length = length
+
+    @property
+    def columns(self) -> list:
+        return [f"{self.name}_{self.length}"]
+
+    def compute(self, ctx: BatchContext) -> list:
+        raise NotImplementedError
+
+    def stream(self):
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return f"{self.name}{self.length or ''}"
+
+
+@register
+class EMA(Indicator):
+    name = "EMA"
+    prefixes = ["EMA"]
+
+    def compute(self, ctx):
+        return [ctx.ema(self.length)]
+
+    def stream(self):
+        return streaming.EMAStream(self.length)
+
+
+@register
+class SMA(Indicator):
+    name = "SMA"
+    prefixes = ["SMA"]
+
+    def compute(self, ctx):
+        return [ctx.rollingMean(self.length)]
+
+    def stream(self):
+        return streaming.SMAStream(self.length)
+
+
+@register
+class RSI(Indicator):
+    name = "RSI"
+    prefixes = ["RSI"]
+
+    def compute(self, ctx):
+        negative = ctx.diff(1).copy()
+        positive = negative.copy()
+        positive[positive < 0] = 0
+        negative[negative > 0] = 0
+        # rma
+        positiveAvg = positive.ewm(alpha=1 / self.length, min_periods=self.length).mean()
+        negativeAvg = negative.ewm(alpha=1 / self.length, min_periods=self.length).mean()
+        return [100 * positiveAvg / (positiveAvg + negativeAvg.abs())]
+
+    def stream(self):
+        return streaming.RSIStream(self.length)
+
+
+@register
+class MACD(Indicator):
+    name = "MACD"
+    prefixes = ["MACD", "MACDh", "MACDs"]
+    needsLength = False
+    fast, slow, signal = 12, 26, 9
+
+    @property
+    def columns(self):
+        props = f"_{self.fast}_{self.slow}_{self.signal}"
+        return [f"MACD{props}", f"MACDh{props}", f"MACDs{props}"]
+
+    def compute(self, ctx):
+        key = ("macd", self.fast, self.slow)
+        macd = ctx.shared(key, lambda: ctx.ema(self.fast) - ctx.ema(self.slow))
+        # the signal ema starts at the first valid macd value
+        first = macd.first_valid_index()
+        if first is None:
+            signal = macd * np.nan
+        else:
+            signal = _ema(macd.loc[first:], self.signal).reindex(macd.index)
+        return [macd, macd - signal, signal]
+
+    def stream(self):
+        return streaming.MACDStream(self.fast, self.slow, self.signal)
+
+
+@register
+class BBANDS(Indicator):
+    name = "BBANDS"
+    prefixes = ["BBL", "BBM", "BBU", "BBB", "BBP"]
+    std = 2.0
+
+    @property
+    def columns(self):
+        props = f"_{self.length}_{self.std}"
+        return [f"BBL{props}", f"BBM{props}", f"BBU{props}", f"BBB{props}", f"BBP{props}"]
+
+    def compute(self, ctx):
+        mid = ctx.rollingMean(self.length)
+        deviations = self.std * ctx.rollingStd(self.length, ddof=0)
+        lower, upper = mid - deviations, mid + deviations
+        ulr = _nonZeroRange(upper, lower)
+        return [lower, mid, upper, 100 * ulr / mid, _nonZeroRange(ctx.P["close"], lower) / ulr]
+
+    def stream(self):
+        return streaming.BBANDSStream(self.length, self.std)
+
+
+@register
+class ZSCORE(Indicator):
+    name = "ZSCORE"
+    prefixes = ["ZS"]
+
+    @property
+    def columns(self):
+        return [f"ZS_{self.length}"]
+
+    def compute(self, ctx):
+        return [(ctx.P["close"] - ctx.rollingMean(self.length)) / ctx.rollingStd(self.length, ddof=1)]
+
+    def stream(self):
+        return streaming.ZSCOREStream(self.length)
+
+
+@register
+class SLOPE(Indicator):
+    name = "SLOPE"
+    prefixes = ["SLOPE"]
+
+    def compute(self, ctx):
+        return [ctx.diff(self.length) / self.length]
+
+    def stream(self):
+        return streaming.SLOPEStream(self.length)
+
+
+@register
+class OBV(Indicator):
+    name = "OBV"
+    prefixes = ["OBV"]
+    needsLength = False
+
+    @property
+    def columns(self):
+        return ["OBV"]
+
+    def compute(self, ctx):
+        sign = ctx.diff(1).copy()
+        sign[sign > 0] = 1
+        sign[sign < 0] = -1
+        if len(sign):
+            sign.iloc[0] = 1
+        return [(sign * ctx.P["volume"]).cumsum()]
+
+    def stream(self):
+        return streaming.OBVStream()
+
+
+def compute(P: pd.DataFrame, specs: list) -> pd.DataFrame:
+    """Computes indicators on a price frame, shared intermediates only once
+
+    Args:
+        P (pd.DataFrame): price data Dataframe
+        specs (list): indicator specs like EMA40 or parsed Indicator instances
+
+    Returns:
+        pd.DataFrame: one column per indicator output, same index as P
+    """
+    ctx = BatchContext(P)
+    out = {}
+    for indicator in validate(specs):
+        for column, values in zip(indicator.columns, indicator.compute(ctx)):
+            out[column] = values
+    return pd.DataFrame(out, index=P.index)
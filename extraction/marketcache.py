@@ -0,0 +1,150 @@
+import json
+import os
+import time
+import logging
+
+import numpy as np
+import pandas as pd
+
+import extraction.generalValues as gv
+from extraction import download, storage
+
+log = logging.getLogger("bot")
+
+
+def mergeRanges(ranges: list) -> list:
+    """Sorts and merges overlapping or touching [startMs, endMs] ranges"""
+    merged = []
+    for s, e in sorted(ranges):
+        if merged and s <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], e)
+        else:
+            merged.append([s, e])
+    return merged
+
+
+def subtractRanges(startMs: int, endMs: int, covered: list) -> list:
+    """Parts of [startMs, endMs] not inside the merged covered ranges"""
+    gaps = []
+    for s, e in covered:
+        if e < startMs or s > endMs:
+            continue
+        if s > startMs:
+            gaps.append((startMs, s - 1))
+        startMs = max(startMs, e + 1)
+    if startMs <= endMs:
+        gaps.append((startMs, endMs))
+    return gaps
+
+
+class MarketStore:
+    """Persistent kline store with one dataset per ticker and interval in a storage backend.
+
+    A coverage file records which time ranges are held locally, so a request only downloads the
+    gaps and overlapping or sliding windows are served from disk.
+    Raw klines are stored with their UTC open time, the local timestamp shift is applied when serving.
+    """
+
+    def __init__(self, root: str = "data/market", backend: str = "npy") -> None:
+        self.root = root
+        self.backend = backend
+        self.coverageFile = f"{root}/coverage.json"
+        if not os.path.exists(root):
+            os.makedirs(root)
+        if os.path.exists(self.coverageFile):
+            with open(self.coverageFile) as f:
+                self.covered = json.load(f)
+        else:
+            self.covered = {}
+
+    def path(self, datID: str) -> str:
+        return f"{self.root}/{datID}"
+
+    def _saveCoverage(self):
+        tmp = f"{self.coverageFile}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.covered, f)
+        os.replace(tmp, self.coverageFile)
+
+    def read(self, datID: str, startMs: int = None, endMs: int = None) -> pd.DataFrame:
+        """Stored raw klines of a dataset, optionally only open times in [startMs, endMs]"""
+        path = self.path(datID)
+        if not storage.exists(path, self.backend):
+            if not os.path.exists(f"{path}.csv"):
+                return pd.DataFrame(columns=gv.klinesIndices)
+            # store written as csv before, convert it once
+            storage.save(pd.read_csv(f"{path}.csv"), path, self.backend)
+            os.remove(f"{path}.csv")
+
+        if startMs is None:
+            return storage.load(path, self.backend)
+        timestamps = storage.loadColumns(path, self.backend)["timestamp"]
+        rows = slice(
+            np.searchsorted(timestamps, startMs, side="left"),
+            np.searchsorted(timestamps, endMs, side="right"),
+        )
+        return storage.load(path, self.backend, mmap=True, rows=rows).copy()
+
+    def write(self, datID: str, klines: pd.DataFrame):
+        storage.save(klines.reset_index(drop=True), self.path(datID), self.backend)
+
+    def missing(self, datID: str, startMs: int, endMs: int) -> list:
+        """(startMs, endMs) ranges of a window that are not stored yet"""
+        return subtractRanges(startMs, endMs, self.covered.get(datID, []))
+
+    def update(self, ranges: dict):
+        """Merges downloaded klines into the store
+
+        Args:
+            ranges (dict): (ticker, interval, startMs, endMs) -> raw klines
+        """
+        byID = {}
+        for r, klines in ranges.items():
+            byID.setdefault(f"{r[0]}_{r[1]}", []).append((r, klines))
+
+        for datID, parts in byID.items():
+            new = pd.DataFrame([k for _, klines in parts for k in klines], columns=gv.klinesIndices)
+            stored = pd.concat([self.read(datID), new]).astype(float).astype({"timestamp": "int64"})
+            # a candle that was still open at download time is replaced by the newer copy
+            stored = stored.drop_duplicates(subset="timestamp", keep="last").sort_values("timestamp")
+            self.write(datID, stored)
+
+            # the current candle is not final, so it is not counted as covered
+            interval = gv.intervalMs[datID.split("_")[-1]]
+            lastClosed = int(time.time() * 1000) // interval * interval - 1
+            covered = self.covered.get(datID, []) + [
+                [r[2], min(r[3], lastClosed)] for r, _ in parts if r[2] <= lastClosed
+            ]
+            self.covered[datID] = mergeRanges(covered)
+        self._saveCoverage()
+
+    def get(self, tasks: list, start, end, refresh: bool = False, progress: bool = True) -> dict:
+        """Raw klines of several (ticker, interval) pairs in a window, downloading only what is missing
+
+        Args:
+            tasks (list): list of (ticker, interval)
+            start (datetime): start date
+            end (datetime): end date, inclusive
+            refresh (bool, optional): download the whole window again. Defaults to False.
+            progress (bool, optional): show a progress bar. Defaults to True.
+
+        Returns:
+            dict: "{ticker}_{interval}" -> raw klines dataframe with open times in the window
+        """
+        startMs, endMs = download.toMilliseconds(start), download.toMilliseconds(end)
+
+        gaps = []
+        for ticker, interval in tasks:
+            datID = f"{ticker}_{interval}"
+            missing = [(startMs, endMs)] if refresh else self.missing(datID, startMs, endMs)
+            gaps += [(ticker, interval, s, e) for s, e in missing]
+
+        if gaps:
+            log.debug(f"Downloading {len(gaps)} missing kline ranges")
+            self.update(download.downloadRanges(gaps, progress=progress))
+
+        dat = {}
+        for ticker, interval in tasks:
+            datID = f"{ticker}_{interval}"
+            dat[datID] = self.read(datID, startMs, endMs)
+        return dat
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+from extraction import indicators as registry
+
+priceFields = ["open", "high", "low", "close", "volume"]
+
+
+class Panel:
+    """Price data of one timeframe for many symbols, one time x symbol array per field.
+
+    Indicators are computed for all symbols at once, each field is handled as a frame with one
+    column per symbol so pandas runs every rolling/ewm over all symbols in one call.
+    Rows a symbol has no bar for are NaN and marked in present.
+    """
+
+    def __init__(
+        self, index: pd.DatetimeIndex, symbols: list, fields: dict, timeFrame: str = "1m", present: np.ndarray = None
+    ) -> None:
+        self.index = index
+        self.symbols = list(symbols)
+        self.fields = fields
+        self.timeFrame = timeFrame
+        self.position = {symbol: j for j, symbol in enumerate(self.symbols)}
+        # time x symbol, True where the symbol has a bar, rows with a close otherwise
+        self.present = present if present is not None else ~np.isnan(fields["close"])
+
+    @classmethod
+    def fromDatadict(cls, dat: dict, timeFrame: str, fields: list = None):
+        """Builds a panel from the dataframes of one timeframe in a datadict
+
+        Args:
+            dat (dict): datadict in default format
+            timeFrame (str): timeframe 1m 15m etc
+            fields (list, optional): columns to take. Defaults to priceFields.
+
+        Returns:
+            Panel: panel on the union of all timestamps
+        """
+        fields = fields if fields is not None else priceFields
+        keys = [key for key in dat if key.split("_")[1] == timeFrame]
+        frames = [dat[key] for key in keys]
+        symbols = [key.split("_")[0] for key in keys]
+
+        index = frames[0].index if frames else pd.DatetimeIndex([])
+        for P in frames[1:]:
+            if not P.index.equals(index):
+                index = index.union(P.index)
+
+        present = np.ones((len(index), len(frames)), dtype=bool)
+        for j, P in enumerate(frames):
+            if not P.index.equals(index):
+                present[:, j] = index.isin(P.index)
+
+        arrays = {}
+        for field in fields:
+            array = np.full((len(index), len(frames)), np.nan)
+            for j, P in enumerate(frames):
+                values = P[field] if P.index.equals(index) else P[field].reindex(index)
+                array[:, j] = values.to_numpy(dtype=float)
+            arrays[field] = array
+        return cls(index, symbols, arrays, timeFrame, present)
+
+    def field(self, name: str) -> pd.DataFrame:
+        """A field as a time x symbol frame on top of the panel array"""
+        return pd.DataFrame(self.fields[name], index=self.index, columns=self.symbols, copy=False)
+
+    def addIndicators(self, indicators: list):
+        """Computes indicators for every symbol in one vectorized pass per indicator.
+        Symbols are grouped by the rows they have bars for (late starts, gaps) and every group is
+        computed on its own rows only, so values match a per coin run.
+
+        Args:
+            indicators (list): indicator specs like EMA40
+        """
+        indicators = registry.validate(indicators)
+        groups = {}
+        for j in range(len(self.symbols)):
+            groups.setdefault(self.present[:, j].tobytes(), []).append(j)
+
+        outputs = {}
+        for columns in groups.values():
+            rows = np.flatnonzero(self.present[:, columns[0]])
+            if len(rows) == 0:
+                continue
+            full = len(rows) == len(self.index)
+            index = self.index if full else self.index[rows]
+            fieldFrames = {
+                name: pd.DataFrame(values[:, columns] if full else values[rows][:, columns], index=index)
+                for name, values in self.fields.items()
+            }
+            ctx = registry.BatchContext(fieldFrames)
+            for indicator in indicators:
+                for column, values in zip(indicator.columns, indicator.compute(ctx)):
+                    if column not in outputs:
+                        outputs[column] = np.full((len(self.index), len(self.symbols)), np.nan)
+                    outputs[column][np.ix_(rows, columns)] = values.to_numpy()
+
+        for indicator in indicators:
+            for column in indicator.columns:
+                self.fields[column] = outputs.get(column, np.full((len(self.index), len(self.symbols)), np.nan))
+
+    def latest(self, name: str) -> pd.Series:
+        """Last row of a field for every symbol, for scanning all pairs"""
+        return pd.Series(self.fields[name][-1], index=self.symbols, name=name)
+
+    def frame(self, symbol: str) -> pd.DataFrame:
+        """Per coin dataframe with every field as a column, like the datadict frames"""
+        j = self.position[symbol]
+        return pd.DataFrame({name: values[:, j] for name, values in self.fields.items()}, index=self.index)
+
+    def toDatadict(self, dat: dict = None) -> dict:
+        """Per coin dataframes of the panel under the datadict names
+
+        Args:
+            dat (dict, optional): datadict to put them in. Defaults to a new one.
+
+        Returns:
+            dict: datadict
+        """
+        dat = dat if dat is not None else {}
+        for symbol in self.symbols:
+            dat[f"{symbol}_{self.timeFrame}"] = self.frame(symbol)
+        return dat
@@ -0,0 +1,206 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import sys
+import time
+import types
+import logging
+
+import pandas as pd
+
+from extraction import storage
+
+log = logging.getLogger("bot")
+
+sections = ["features", "trades"]
+
+# modules below this folder count as code of the repository
+repoRoot = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def makeKey(*parts) -> str:
+    """Hash of json serializable parts (datetimes and other objects by their str)"""
+    text = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def hashData(dat: dict) -> str:
+    """Content hash of a datadict: keys, columns, index and every value"""
+    h = hashlib.blake2b(digest_size=16)
+    for key in sorted(dat):
+        P = dat[key]
+        h.update(json.dumps([key, [str(c) for c in P.columns], [str(d) for d in P.dtypes]]).encode())
+        h.update(pd.util.hash_pandas_object(P, index=True).values.tobytes())
+    return h.hexdigest()
+
+
+def hashStrategy(strategy) -> str:
+    """Hash of a strategy's code: the source of its whole module, so edits to helpers it calls count too,
+    its name and a `version` attribute if it has one. Falls back to the bytecode without source.
+    """
+    try:
+        code = inspect.getsource(inspect.getmodule(strategy) or strategy)
+    except (OSError, TypeError):
+        function = getattr(strategy, "__code__", None)
+        code = repr((function.co_code, function.co_consts)) if function is not None else repr(strategy)
+    return makeKey(code, getattr(strategy, "__qualname__", repr(strategy)), getattr(strategy, "version", None))
+
+
+def repoModules(*objects) -> list:
+    """Modules of the repository the objects are defined in and every repository module those import,
+    followed recursively through module globals (imported modules, functions and classes)
+
+    Returns:
+        list: modules sorted by name
+    """
+    def inRepo(module) -> bool:
+        path = getattr(module, "__file__", None)
+        return path is not None and os.path.abspath(path).startswith(repoRoot + os.sep) and "site-packages" not in path
+
+    pending = [obj if isinstance(obj, types.ModuleType) else sys.modules.get(obj.__module__) for obj in objects]
+    found = {}
+    while pending:
+        module = pending.pop()
+        if module is None or module.__name__ in found or not inRepo(module):
+            continue
+        found[module.__name__] = module
+        for value in vars(module).values():
+            if not isinstance(value, types.ModuleType):
+                value = sys.modules.get(getattr(value, "__module__", None) or "")
+            if value is not None and value.__name__ not in found:
+                pending.append(value)
+    return [found[name] for name in sorted(found)]
+
+
+def hashCode(*objects) -> str:
+    """Hash of the source of every repository module the objects depend on, see repoModules.
+    Any edit to the code a computation runs through gives a new hash.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for module in repoModules(*objects):
+        with open(module.__file__, "rb") as f:
+            h.update(module.__name__.encode() + b"\0" + f.read())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """Disk cache of indicator enriched datadicts ("features") and backtest trade tables ("trades"),
+    addressed by content hashes of their inputs so a changed input never hits a stale entry.
+
+    Entries are kept in a storage backend, an index file records their size and last use and the
+    least recently used ones are evicted when the cache grows over maxBytes.
+    """
+
+    def __init__(self, root: str = "DiagnosticsV2/cache", maxBytes: int = 2 * 1024**3, backend: str = "npy") -> None:
+        self.root = root
+        self.maxBytes = maxBytes
+        self.backend = backend
+        self.indexFile = f"{root}/index.json"
+        for section in sections:
+            os.makedirs(f"{root}/{section}", exist_ok=True)
+        if os.path.exists(self.indexFile):
+            with open(self.indexFile) as f:
+                self.index = json.load(f)
+        else:
+            self.index = {}
+
+    def path(self, section: str, key: str) -> str:
+        return f"{self.root}/{section}/{key}"
+
+    def _saveIndex(self):
+        tmp = f"{self.indexFile}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.indexFile)
+
+    def get(self, section: str, key: str):
+        """Cached entry or None
+
+        Args:
+            section (str): "features" or "trades"
+            key (str): content hash of the inputs
+
+        Returns:
+            dict or pd.DataFrame: datadict for features, tradeData for trades
+        """
+        entry = self.index.get(f"{section}/{key}")
+        if entry is None:
+            return None
+        path = self.path(section, key)
+        try:
+            if section == "features":
+                value = {name: storage.load(f"{path}/{name}", self.backend) for name in entry["names"]}
+            else:
+                value = storage.load(path, self.backend)
+        except (OSError, ValueError) as e:
+            log.warning(f"Dropping unreadable cache entry {section}/{key}: {e}")
+            self._remove(f"{section}/{key}")
+            self._saveIndex()
+            return None
+        entry["used"] = time.time()
+        self._saveIndex()
+        return value
+
+    def put(self, section: str, key: str, value):
+        """Stores an entry, then evicts least recently used entries over the size limit
+
+        Args:
+            section (str): "features" or "trades"
+            key (str): content hash of the inputs
+            value (dict or pd.DataFrame): datadict for features, tradeData for trades
+        """
+        if section not in sections:
+            raise ValueError(f"Unknown cache section: {section}, options: {sections}")
+        name = f"{section}/{key}"
+        self._remove(name)
+        path = self.path(section, key)
+        if section == "features":
+            os.makedirs(path)
+            for datID, P in value.items():
+                storage.save(P, f"{path}/{datID}", self.backend)
+            names = list(value)
+        else:
+            storage.save(value, path, self.backend)
+            names = None
+
+        self.index[name] = {"bytes": self._size(path), "used": time.time(), "names": names}
+        self._evict(keep=name)
+        self._saveIndex()
+
+    def _size(self, path: str) -> int:
+        paths = [path] if os.path.exists(path) else [storage.filePath(path, self.backend)]
+        total = 0
+        for p in paths:
+            if os.path.isfile(p):
+                total += os.path.getsize(p)
+            for folder, _, files in os.walk(p):
+                total += sum(os.path.getsize(os.path.join(folder, f)) for f in files)
+        return total
+
+    def _remove(self, name: str):
+        self.index.pop(name, None)
+        section, key = name.split("/")
+        path = self.path(section, key)
+        for p in (path, storage.filePath(path, self.backend)):
+            if os.path.isdir(p):
+                shutil.rmtree(p)
+            elif os.path.isfile(p):
+                os.remove(p)
+
+    def _evict(self, keep: str = None):
+        total = sum(entry["bytes"] for entry in self.index.values())
+        for name in sorted(self.index, key=lambda n: self.index[n]["used"]):
+            if total <= self.maxBytes:
+                break
+            if name == keep:
+                continue
+            total -= self.index[name]["bytes"]
+            log.debug(f"Evicting cache entry {name}")
+            self._remove(name)
+
+    @property
+    def size(self) -> int:
+        """Bytes held by the cache"""
+        return sum(entry["bytes"] for entry in self.index.values())
@@ -0,0 +1,249 @@
+import json
+import os
+import shutil
+import logging
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+
+    hasArrow = True
+except ImportError:
+    hasArrow = False
+
+log = logging.getLogger("bot")
+
+
+def _encode(values: np.ndarray):
+    """Column values as a plain numpy array plus the dtype to restore, timestamps become int64 epoch ns"""
+    values = np.asarray(values)
+    if values.dtype.kind == "M":
+        return values.astype("datetime64[ns]").view("int64"), "datetime64[ns]"
+    if values.dtype.kind not in "biuf":
+        # text and mixed columns are pickled, they are small next to the numeric data
+        return values.astype(object), "object"
+    return values, str(values.dtype)
+
+
+def _frameColumns(frame: pd.DataFrame) -> dict:
+    out = {name: frame[name].values for name in frame.columns}
+    if not isinstance(frame.index, pd.RangeIndex):
+        out["index"] = frame.index.values
+    return out
+
+
+def _decode(values: np.ndarray, dtype: str) -> np.ndarray:
+    if dtype == "datetime64[ns]":
+        return values.view("datetime64[ns]")
+    return values
+
+
+class NpyBackend:
+    """Columnar numpy format, a directory with one 2D block per dtype in which every column is contiguous.
+
+    Timestamps are stored as int64 epoch ns. Blocks can be memory mapped, a frame of one dtype is then
+    built without copying and only the pages that are used get read from disk.
+    """
+
+    extension = ".npd"
+
+    def write(self, path: str, frame: pd.DataFrame):
+        tmp = f"{path}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        meta = {"columns": list(frame.columns), "nrows": len(frame), "blocks": [], "index": None}
+        groups = {}
+        for i in range(frame.shape[1]):
+            values, dtype = _encode(frame.iloc[:, i].values)
+            groups.setdefault(dtype, []).append((i, values))
+        for k, (dtype, columns) in enumerate(groups.items()):
+            np.save(f"{tmp}/block{k}.npy", np.stack([values for _, values in columns]))
+            meta["blocks"].append({"dtype": dtype, "columns": [i for i, _ in columns]})
+
+        if not isinstance(frame.index, pd.RangeIndex):
+            values, dtype = _encode(frame.index)
+            np.save(f"{tmp}/index.npy", values)
+            meta["index"] = {"name": frame.index.name, "dtype": dtype}
+
+        with open(f"{tmp}/meta.json", "w") as f:
+            json.dump(meta, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.rename(tmp, path)
+
+    def _load(self, path: str, name: str, mmap: bool, meta: dict, dtype: str) -> np.ndarray:
+        # empty and pickled arrays can't be mapped
+        if dtype == "object":
+            return np.load(f"{path}/{name}", allow_pickle=True)
+        values = np.load(f"{path}/{name}", mmap_mode="r" if mmap and meta["nrows"] else None)
+        return _decode(values, dtype)
+
+    def read(self, path: str, mmap: bool = False, rows: slice = None) -> pd.DataFrame:
+        with open(f"{path}/meta.json") as f:
+            meta = json.load(f)
+        rows = rows if rows is not None else slice(None)
+
+        parts = []
+        for k, block in enumerate(meta["blocks"]):
+            values = self._load(path, f"block{k}.npy", mmap, meta, block["dtype"])[:, rows]
+            parts.append(pd.DataFrame(values.T, columns=block["columns"], copy=False))
+
+        if len(parts) == 1:
+            frame = parts[0]
+        elif parts:
+            frame = pd.concat(parts, axis=1)[list(range(len(meta["columns"])))]
+        else:
+            frame = pd.DataFrame(index=range(len(range(meta["nrows"])[rows])))
+        frame.columns = meta["columns"]
+
+        if meta["index"] is not None:
+            index = self._load(path, "index.npy", mmap, meta, meta["index"]["dtype"])[rows]
+            frame.index = pd.Index(index, name=meta["index"]["name"])
+        return frame
+
+    def columns(self, path: str, mmap: bool = True) -> dict:
+        """Stored columns as arrays (memory mapped by default) without building a frame"""
+        with open(f"{path}/meta.json") as f:
+            meta = json.load(f)
+        out = {}
+        for k, block in enumerate(meta["blocks"]):
+            values = self._load(path, f"block{k}.npy", mmap, meta, block["dtype"])
+            for row, i in enumerate(block["columns"]):
+                out[meta["columns"][i]] = values[row]
+        if meta["index"] is not None:
+            out["index"] = self._load(path, "index.npy", mmap, meta, meta["index"]["dtype"])
+        return out
+
+
+class ParquetBackend:
+    """Parquet through pyarrow, timestamps are stored as int64 epoch ns"""
+
+    extension = ".parquet"
+
+    def write(self, path: str, frame: pd.DataFrame):
+        frame.to_parquet(f"{path}.tmp", index=not isinstance(frame.index, pd.RangeIndex))
+        os.replace(f"{path}.tmp", path)
+
+    def read(self, path: str, mmap: bool = False, rows: slice = None) -> pd.DataFrame:
+        frame = pd.read_parquet(path, memory_map=mmap)
+        return frame.iloc[rows] if rows is not None else frame
+
+    def columns(self, path: str, mmap: bool = True) -> dict:
+        return _frameColumns(self.read(path, mmap))
+
+
+class FeatherBackend(ParquetBackend):
+    """Feather (arrow ipc) through pyarrow, the index is kept as a marked column"""
+
+    extension = ".feather"
+    indexPrefix = "__index__"
+
+    def write(self, path: str, frame: pd.DataFrame):
+        if not isinstance(frame.index, pd.RangeIndex):
+            frame = frame.rename_axis(f"{self.indexPrefix}{frame.index.name or ''}").reset_index()
+        frame.to_feather(f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+    def read(self, path: str, mmap: bool = False, rows: slice = None) -> pd.DataFrame:
+        frame = pd.read_feather(path, use_threads=True)
+        first = frame.columns[0] if len(frame.columns) else ""
+        if str(first).startswith(self.indexPrefix):
+            frame = frame.set_index(first).rename_axis(first[len(self.indexPrefix):] or None)
+        return frame.iloc[rows] if rows is not None else frame
+
+
+class CSVBackend:
+    """Text format of the older data folders, kept for import and export"""
+
+    extension = ".csv"
+
+    def write(self, path: str, frame: pd.DataFrame):
+        frame.to_csv(f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+    def read(self, path: str, mmap: bool = False, rows: slice = None) -> pd.DataFrame:
+        frame = pd.read_csv(path, index_col=0)
+        if not pd.api.types.is_numeric_dtype(frame.index):
+            frame.index = pd.to_datetime(frame.index)
+        elif (frame.index == np.arange(len(frame))).all():
+            frame = frame.reset_index(drop=True)
+        return frame.iloc[rows] if rows is not None else frame
+
+    def columns(self, path: str, mmap: bool = True) -> dict:
+        return _frameColumns(self.read(path))
+
+
+backends = {
+    "npy": NpyBackend(),
+    "parquet": ParquetBackend(),
+    "feather": FeatherBackend(),
+    "csv": CSVBackend(),
+}
+
+
+def getBackend(name: str):
+    """Storage backend by name: "npy", "parquet", "feather" or "csv"
+
+    Raises:
+        ValueError: unknown backend
+        ImportError: parquet or feather without pyarrow installed
+    """
+    if name not in backends:
+        raise ValueError(f"Unknown storage backend {name}, options: {list(backends)}")
+    if name in ("parquet", "feather") and not hasArrow:
+        raise ImportError(f"The {name} backend needs pyarrow, install it or use the npy backend")
+    return backends[name]
+
+
+def filePath(path: str, backend: str = "npy") -> str:
+    """Path of a dataset including the backend's extension"""
+    return f"{path}{getBackend(backend).extension}"
+
+
+def exists(path: str, backend: str = "npy") -> bool:
+    return os.path.exists(filePath(path, backend))
+
+
+def save(frame: pd.DataFrame, path: str, backend: str = "npy"):
+    """Saves a dataframe, replacing an earlier version atomically
+
+    Args:
+        frame (pd.DataFrame): data with a default or datetime index
+        path (str): location without extension
+        backend (str, optional): storage format. Defaults to "npy".
+    """
+    getBackend(backend).write(filePath(path, backend), frame)
+
+
+def load(path: str, backend: str = "npy", mmap: bool = False, rows: slice = None) -> pd.DataFrame:
+    """Loads a dataframe saved with save()
+
+    Args:
+        path (str): location without extension
+        backend (str, optional): storage format. Defaults to "npy".
+        mmap (bool, optional): memory map the stored arrays instead of reading them. Defaults to False.
+        rows (slice, optional): only these rows, with mmap only they are read. Defaults to all.
+
+    Returns:
+        pd.DataFrame: stored data
+    """
+    return getBackend(backend).read(filePath(path, backend), mmap, rows)
+
+
+def loadColumns(path: str, backend: str = "npy", mmap: bool = True) -> dict:
+    """Stored columns as a dict of arrays, the index under "index". Memory mapped for the npy backend."""
+    return getBackend(backend).columns(filePath(path, backend), mmap)
+
+
+def importCSV(csvPath: str, path: str, backend: str = "npy") -> pd.DataFrame:
+    """Converts a csv file in the older format to a backend"""
+    frame = backends["csv"].read(csvPath)
+    save(frame, path, backend)
+    return frame
+
+
+def exportCSV(path: str, csvPath: str, backend: str = "npy"):
+    """Writes a stored dataset as csv"""
+    backends["csv"].write(csvPath, load(path, backend))
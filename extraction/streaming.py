@@ -0,0 +1,384 @@
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+
+class EWM:
+    """Exponentially weighted mean updated one value at a time.
+
+    Mirrors the recursion pandas uses for Series.ewm(...).mean() (ignore_na=False) so
+    values match pandas_ta, which is built on top of it.
+    """
+
+    def __init__(self, alpha: float, adjust: bool = False, minPeriods: int = 0) -> None:
+        com = 1 / alpha - 1
+        alpha = 1 / (1 + com)
+        self.oldWtFactor = 1 - alpha
+        self.newWt = 1.0 if adjust else alpha
+        self.adjust = adjust
+        self.minPeriods = max(minPeriods, 1)
+        self.weighted = math.nan
+        self.oldWt = 1.0
+        self.nobs = 0
+        self.value = math.nan
+
+    def update(self, x: float) -> float:
+        isObservation = x == x
+        self.nobs += int(isObservation)
+        if self.weighted == self.weighted:
+            self.oldWt *= self.oldWtFactor
+            if isObservation:
+                if self.weighted != x:
+                    self.weighted = (self.oldWt * self.weighted + self.newWt * x) / (
+                        self.oldWt + self.newWt
+                    )
+                if self.adjust:
+                    self.oldWt += self.newWt
+                else:
+                    self.oldWt = 1.0
+        elif isObservation:
+            self.weighted = x
+
+        self.value = self.weighted if self.nobs >= self.minPeriods else math.nan
+        return self.value
+
+
+class EMA:
+    """pandas_ta ema: sma of the first `length` values as seed, then ewm(span=length, adjust=False)"""
+
+    def __init__(self, length: int) -> None:
+        self.length = length
+        self.seed = []
+        self.ewm = EWM(2 / (length + 1))
+        self.value = math.nan
+
+    def update(self, x: float) -> float:
+        if len(self.seed) < self.length:
+            self.seed.append(x)
+            if len(self.seed) < self.length:
+                return self.value
+            x = np.nanmean(self.seed)
+        self.value = self.ewm.update(x)
+        return self.value
+
+
+class Rolling:
+    """Rolling window mean and variance with O(1) add/remove (Welford)"""
+
+    def __init__(self, length: int) -> None:
+        self.length = length
+        self.window = deque()
+        self.mean = 0.0
+        self.ssqdm = 0.0
+        self.removed = 0
+        self.sameCount = 0
+
+    def update(self, x: float) -> None:
+        self.sameCount = self.sameCount + 1 if self.window and self.window[-1] == x else 1
+        self.window.append(x)
+        n = len(self.window)
+        delta = x - self.mean
+        self.mean += delta / n
+        self.ssqdm += delta * (x - self.mean)
+
+        if n > self.length:
+            old = self.window.popleft()
+            n -= 1
+            delta = old - self.mean
+            self.mean -= delta / n
+            self.ssqdm -= delta * (old - self.mean)
+            self.removed += 1
+
+            # resync now and then so add/remove rounding cannot build up over days of bars
+            if self.removed % (10 * self.length) == 0:
+                window = np.fromiter(self.window, dtype=float, count=n)
+                self.mean = window.mean()
+                self.ssqdm = ((window - self.mean) ** 2).sum()
+
+    @property
+    def ready(self) -> bool:
+        return len(self.window) >= self.length
+
+    def var(self, ddof: int = 1) -> float:
+        if not self.ready:
+            return math.nan
+        if self.sameCount >= self.length:
+            # flat window, exact like pandas instead of rounding noise
+            return 0.0
+        return max(self.ssqdm, 0.0) / (self.length - ddof)
+
+    def std(self, ddof: int = 1) -> float:
+        return math.sqrt(self.var(ddof))
+
+    def sma(self) -> float:
+        if not self.ready:
+            return math.nan
+        return self.window[-1] if self.sameCount >= self.length else self.mean
+
+
+class Diff:
+    """x[t] - x[t - length]"""
+
+    def __init__(self, length: int) -> None:
+        self.window = deque(maxlen=length + 1)
+
+    def update(self, x: float) -> float:
+        self.window.append(x)
+        if len(self.window) < self.window.maxlen:
+            return math.nan
+        return x - self.window[0]
+
+
+def _div(a: float, b: float) -> float:
+    # float division with pandas semantics instead of ZeroDivisionError
+    if b == 0:
+        return math.nan if a == 0 or a != a else math.copysign(math.inf, a)
+    return a / b
+
+
+def _nonZero(x: float) -> float:
+    # pandas_ta non_zero_range
+    return x + np.finfo(float).eps if x == 0 else x
+
+
+class StreamContext:
+    """State shared by the indicators of one series (emas, rolling windows, diffs).
+    Every shared state is updated once per bar however many indicators read it.
+    """
+
+    def __init__(self) -> None:
+        self.states = {}
+        self.values = {}
+        self.bar = None
+
+    def start(self, bar: dict):
+        self.bar = bar
+        self.values = {}
+
+    def shared(self, key, make, step):
+        if key not in self.values:
+            if key not in self.states:
+                self.states[key] = make()
+            self.values[key] = step(self.states[key])
+        return self.values[key]
+
+    def ema(self, length: int) -> float:
+        return self.shared(("ema", length), lambda: EMA(length), lambda s: s.update(self.bar["close"]))
+
+    def rolling(self, length: int) -> Rolling:
+        def step(rolling):
+            rolling.update(self.bar["close"])
+            return rolling
+
+        return self.shared(("rolling", length), lambda: Rolling(length), step)
+
+    def diff(self, length: int) -> float:
+        return self.shared(("diff", length), lambda: Diff(length), lambda s: s.update(self.bar["close"]))
+
+
+class EMAStream:
+    def __init__(self, length: int) -> None:
+        self.length = length
+        self.columns = [f"EMA_{length}"]
+
+    def update(self, ctx: StreamContext) -> list:
+        return [ctx.ema(self.length)]
+
+
+class SMAStream:
+    def __init__(self, length: int) -> None:
+        self.length = length
+        self.columns = [f"SMA_{length}"]
+
+    def update(self, ctx: StreamContext) -> list:
+        return [ctx.rolling(self.length).sma()]
+
+
+class RSIStream:
+    def __init__(self, length: int) -> None:
+        self.positive = EWM(1 / length, adjust=True, minPeriods=length)
+        self.negative = EWM(1 / length, adjust=True, minPeriods=length)
+        self.columns = [f"RSI_{length}"]
+
+    def update(self, ctx: StreamContext) -> list:
+        change = ctx.diff(1)
+        positive = self.positive.update(max(change, 0.0) if change == change else change)
+        negative = self.negative.update(min(change, 0.0) if change == change else change)
+        return [100 * _div(positive, positive + abs(negative))]
+
+
+class MACDStream:
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9) -> None:
+        self.fast = fast
+        self.slow = slow
+        self.signal = EMA(signal)
+        props = f"_{fast}_{slow}_{signal}"
+        self.columns = [f"MACD{props}", f"MACDh{props}", f"MACDs{props}"]
+
+    def update(self, ctx: StreamContext) -> list:
+        macd = ctx.ema(self.fast) - ctx.ema(self.slow)
+        # pandas_ta only starts the signal ema at the first valid macd value
+        signal = self.signal.update(macd) if macd == macd else math.nan
+        return [macd, macd - signal, signal]
+
+
+class BBANDSStream:
+    def __init__(self, length: int, std: float = 2.0) -> None:
+        self.length = length
+        self.std = std
+        props = f"_{length}_{std}"
+        self.columns = [f"BBL{props}", f"BBM{props}", f"BBU{props}", f"BBB{props}", f"BBP{props}"]
+
+    def update(self, ctx: StreamContext) -> list:
+        rolling = ctx.rolling(self.length)
+        mid = rolling.sma()
+        deviations = self.std * rolling.std(ddof=0)
+        lower, upper = mid - deviations, mid + deviations
+        ulr = _nonZero(upper - lower)
+        return [lower, mid, upper, 100 * _div(ulr, mid), _div(_nonZero(ctx.bar["close"] - lower), ulr)]
+
+
+class ZSCOREStream:
+    def __init__(self, length: int) -> None:
+        self.length = length
+        self.columns = [f"ZS_{length}"]
+
+    def update(self, ctx: StreamContext) -> list:
+        rolling = ctx.rolling(self.length)
+        return [_div(ctx.bar["close"] - rolling.sma(), rolling.std(ddof=1))]
+
+
+class SLOPEStream:
+    def __init__(self, length: int) -> None:
+        self.length = length
+        self.columns = [f"SLOPE_{length}"]
+
+    def update(self, ctx: StreamContext) -> list:
+        return [ctx.diff(self.length) / self.length]
+
+
+class OBVStream:
+    def __init__(self) -> None:
+        self.obv = 0.0
+        self.columns = ["OBV"]
+
+    def update(self, ctx: StreamContext) -> list:
+        change = ctx.diff(1)
+        sign = 1 if change != change else np.sign(change)
+        self.obv += sign * ctx.bar["volume"]
+        return [self.obv]
+
+
+def makeIndicator(indicator: str):
+    """Creates the streaming counterpart of an indicator spec, see extraction.indicators
+
+    Args:
+        indicator (str): indicator in the form EMA40
+
+    Returns:
+        object: indicator with a `columns` list and an `update(ctx)` method
+    """
+    from extraction import indicators
+
+    return indicators.parse(indicator).stream()
+
+
+class IndicatorStream:
+    """Keeps the indicator state of a single price series and updates it in O(1) per closed bar.
+
+    Values equal pandas_ta run over every bar the stream has seen, i.e. the history it was
+    seeded with plus all updates since.
+    """
+
+    def __init__(self, indicators: list) -> None:
+        from extraction import indicators as registry
+
+        self.indicators = [indicator.stream() for indicator in registry.validate(indicators)]
+        self.columns = [column for ind in self.indicators for column in ind.columns]
+        self.context = StreamContext()
+        self.lastTime = None
+
+    def update(self, timestamp, bar: dict) -> dict:
+        """Feeds one closed bar, bars at or before the last seen timestamp are ignored
+
+        Args:
+            timestamp (datetime): bar timestamp
+            bar (dict): bar with at least close (and volume for OBV)
+
+        Returns:
+            dict: column name -> indicator value, None if the bar was ignored
+        """
+        if self.lastTime is not None and timestamp <= self.lastTime:
+            return None
+        self.lastTime = timestamp
+
+        self.context.start(bar)
+        values = []
+        for ind in self.indicators:
+            values.extend(ind.update(self.context))
+        return dict(zip(self.columns, values))
+
+    def seed(self, P: pd.DataFrame) -> pd.DataFrame:
+        """Warms the stream up on historical data
+
+        Args:
+            P (pd.DataFrame): price data Dataframe
+
+        Returns:
+            pd.DataFrame: indicator values for every row of P
+        """
+        fields = [field for field in ["close", "volume"] if field in P.columns]
+        arrays = [P[field].to_numpy(dtype=float) for field in fields]
+        rows = []
+        for i, timestamp in enumerate(P.index):
+            values = self.update(timestamp, {f: a[i] for f, a in zip(fields, arrays)})
+            rows.append([math.nan] * len(self.columns) if values is None else list(values.values()))
+        return pd.DataFrame(rows, index=P.index, columns=self.columns)
+
+
+def initStreams(dat: dict, timeFrame: str, indicators: list) -> dict:
+    """Creates and seeds an IndicatorStream for every dataset of a timeframe
+
+    Args:
+        dat (dict): datadict in default format
+        timeFrame (str): timeframe 1m 15m etc
+        indicators (list): list of indicators to stream
+
+    Returns:
+        dict: dataset name -> seeded IndicatorStream
+    """
+    streams = {}
+    for key in dat.keys():
+        if key.split("_")[1] == timeFrame:
+            streams[key] = IndicatorStream(indicators)
+            streams[key].seed(dat[key])
+    return streams
+
+
+def updateIndicatorsMultiple(streams: dict, dat: dict, timeFrame: str) -> dict:
+    """Incremental replacement of genIndicatorsMultiple for the live bot.
+    Feeds the latest row of every dataset of a timeframe to its stream and writes the indicator values into that row.
+
+    Args:
+        streams (dict): streams from initStreams
+        dat (dict): datadict in default format, latest bar appended
+        timeFrame (str): timeframe 1m 15m etc
+
+    Returns:
+        dict: datadict with indicators of the latest row filled in
+    """
+    for key, stream in streams.items():
+        if key.split("_")[1] != timeFrame or not stream.columns:
+            continue
+        P = dat[key]
+        row = P.iloc[-1]
+        values = stream.update(P.index[-1], row)
+        if values is None:
+            continue
+        for column in stream.columns:
+            if column not in P.columns:
+                P[column] = np.nan
+        P.iloc[-1, P.columns.get_indexer(stream.columns)] = list(values.values())
+    return dat
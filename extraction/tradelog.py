@@ -0,0 +1,183 @@
+import hashlib
+import io
+import json
+import os
+from glob import glob
+import logging
+
+import numpy as np
+import pandas as pd
+
+from extraction import storage
+
+log = logging.getLogger("bot")
+
+# columns of the bot's trade logs, for results without any stored rows
+logColumns = [
+    "timestamp",
+    "close",
+    "buying",
+    "ticker",
+    "coinAmount",
+    "baseAmount",
+    "profit",
+    "timeHeld",
+    "strategy",
+    "failed",
+    "slip",
+    "BNBAmount",
+    "base",
+    "source",
+]
+
+
+class TradeLog:
+    """Catalog of the bot's trade log csv files consolidated in one timestamp sorted store.
+
+    The bot rewrites its log file with every trade, earlier rows staying the same, so for every file
+    the catalog keeps the size, mtime, byte offset ingested so far and a hash of the bytes up to it.
+    Unchanged files are skipped. A grown file whose ingested bytes hash the same is only parsed past
+    the offset, any other changed file is ingested again. Rows keep the file they came from in a
+    "source" column.
+    """
+
+    def __init__(self, folder: str = "logData", pattern: str = "*0.csv", root: str = None, backend: str = "npy") -> None:
+        self.folder = folder
+        self.pattern = pattern
+        self.root = root or f"{folder}/catalog"
+        self.backend = backend
+        self.catalogFile = f"{self.root}/catalog.json"
+        self.storePath = f"{self.root}/trades"
+        os.makedirs(self.root, exist_ok=True)
+        if os.path.exists(self.catalogFile):
+            with open(self.catalogFile) as f:
+                catalog = json.load(f)
+        else:
+            catalog = {"files": {}, "nextID": 0}
+        self.files = catalog["files"]
+        self.nextID = catalog["nextID"]
+
+    def _saveCatalog(self):
+        tmp = f"{self.catalogFile}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"files": self.files, "nextID": self.nextID}, f)
+        os.replace(tmp, self.catalogFile)
+
+    def _loadStore(self) -> pd.DataFrame:
+        if not storage.exists(self.storePath, self.backend):
+            return pd.DataFrame()
+        return storage.load(self.storePath, self.backend)
+
+    def _read(self, path: str, entry: dict, size: int):
+        """New rows of a file and whether they extend the rows already stored for it"""
+        with open(path, "rb") as f:
+            appended = False
+            if entry.get("prefix") and size > entry["offset"]:
+                # hashing the ingested bytes again is cheap next to parsing them
+                digest = hashlib.blake2b(f.read(entry["offset"]), digest_size=16)
+                appended = digest.hexdigest() == entry["prefix"]
+            if not appended:
+                f.seek(0)
+                header = f.readline()
+                digest = hashlib.blake2b(header, digest_size=16)
+                entry.update({"header": header.decode(), "offset": len(header)})
+            data = f.read(size - entry["offset"])
+
+        # a row still being written is left for the next refresh
+        data = data[: data.rfind(b"\n") + 1]
+        digest.update(data)
+        entry.update({"offset": entry["offset"] + len(data), "prefix": digest.hexdigest()})
+        return self._parse(entry, data), appended
+
+    def _parse(self, entry: dict, data: bytes) -> pd.DataFrame:
+        if not data:
+            return pd.DataFrame()
+        P = pd.read_csv(io.BytesIO(entry["header"].encode() + data)).iloc[:, 1::]
+        P["timestamp"] = pd.to_datetime(P["timestamp"], errors="coerce")
+        P = P[P["timestamp"].notna()]
+        P["source"] = entry["id"]
+        return P
+
+    def refresh(self) -> int:
+        """Ingests new and changed log files
+
+        Returns:
+            int: number of files ingested
+        """
+        paths = {os.path.basename(p): p for p in glob(os.path.join(self.folder, self.pattern))}
+        removed = [name for name in self.files if name not in paths]
+        changed = []
+        for name, path in sorted(paths.items()):
+            stat = os.stat(path)
+            entry = self.files.get(name)
+            if entry is None or entry["mtime"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+                changed.append((name, path, stat))
+        if not changed and not removed:
+            return 0
+
+        store = self._loadStore()
+        drop = [self.files.pop(name)["id"] for name in removed]
+        parts = []
+        for name, path, stat in changed:
+            entry = self.files.get(name)
+            known = entry is not None
+            if not known:
+                entry = {"id": self.nextID, "offset": 0, "prefix": ""}
+                self.nextID += 1
+            entry["path"] = path
+            rows, appended = self._read(path, entry, stat.st_size)
+            if known and not appended:
+                drop.append(entry["id"])
+            entry.update({"mtime": stat.st_mtime_ns, "size": stat.st_size})
+            self.files[name] = entry
+            parts.append(rows)
+
+        if drop and len(store):
+            store = store[~store["source"].isin(drop)]
+        store = pd.concat([store] + parts, ignore_index=True)
+        if len(store):
+            store = store.sort_values("timestamp", kind="mergesort").reset_index(drop=True)
+        storage.save(store, self.storePath, self.backend)
+        self._saveCatalog()
+        log.debug(f"Trade log: ingested {len(changed)} files, {len(store)} rows stored")
+        return len(changed)
+
+    def query(self, start=None, end=None, refresh: bool = True) -> pd.DataFrame:
+        """Trades with start <= timestamp <= end, only those rows are loaded
+
+        Args:
+            start (datetime, optional): first time. Defaults to the first trade.
+            end (datetime, optional): last time. Defaults to the last trade.
+            refresh (bool, optional): ingest changed log files first. Defaults to True.
+
+        Returns:
+            pd.DataFrame: trades sorted by timestamp
+        """
+        if refresh:
+            self.refresh()
+        empty = pd.DataFrame(columns=logColumns)
+        if not storage.exists(self.storePath, self.backend):
+            return empty
+        if start is None and end is None:
+            store = storage.load(self.storePath, self.backend)
+            return store if "timestamp" in store.columns else empty
+
+        columns = storage.loadColumns(self.storePath, self.backend)
+        if "timestamp" not in columns:
+            return empty
+        timestamps = columns["timestamp"]
+        rows = slice(
+            np.searchsorted(timestamps, np.datetime64(pd.Timestamp(start), "ns"), side="left") if start is not None else 0,
+            np.searchsorted(timestamps, np.datetime64(pd.Timestamp(end), "ns"), side="right") if end is not None else len(timestamps),
+        )
+        return storage.load(self.storePath, self.backend, mmap=True, rows=rows).copy()
+
+    def latest(self) -> str:
+        """Name of the most recently created log file, like the newest file by ctime"""
+        self.refresh()
+        return max(self.files, key=lambda name: os.path.getctime(self.files[name]["path"]))
+
+    def fileRows(self, name: str) -> pd.DataFrame:
+        """Stored rows of one log file in file order"""
+        store = self.query(refresh=False)
+        return store[store["source"] == self.files[name]["id"]]
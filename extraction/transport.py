@@ -0,0 +1,178 @@
+import heapq
+import itertools
+import threading
+import time
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger("bot")
+
+API_URL = "https://api.binance.com/api/v3"
+
+# Call priorities, lower goes first
+CRITICAL = 0
+NORMAL = 1
+BACKGROUND = 2
+
+
+class WeightBudget:
+    """Keeps REST traffic within the exchange's request weight per minute.
+
+    Used weight is taken from the X-MBX-USED-WEIGHT-1M response header, calls wait in priority order
+    until their weight fits and a part of the budget is only available to critical calls.
+    After a 429/418 every call waits for the Retry-After period.
+    """
+
+    def __init__(self, limit: int = 1200, reserve: int = 200) -> None:
+        self.limit = limit
+        self.reserve = reserve
+        self.used = 0
+        self.window = self._minute()
+        self.bannedUntil = 0.0
+        self.waiting = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+
+    @staticmethod
+    def _minute() -> int:
+        return int(time.time() // 60)
+
+    def _roll(self):
+        if self._minute() != self.window:
+            self.window = self._minute()
+            self.used = 0
+
+    def acquire(self, weight: int = 1, priority: int = NORMAL):
+        """Blocks until a call of this weight may be sent
+
+        Args:
+            weight (int, optional): request weight of the call. Defaults to 1.
+            priority (int, optional): CRITICAL, NORMAL or BACKGROUND. Defaults to NORMAL.
+        """
+        cap = self.limit if priority == CRITICAL else self.limit - self.reserve
+        with self.condition:
+            ticket = (priority, next(self.counter))
+            heapq.heappush(self.waiting, ticket)
+            while True:
+                self._roll()
+                now = time.time()
+                if self.waiting[0] == ticket and now >= self.bannedUntil and self.used + weight <= cap:
+                    break
+                # wake up at the next window or the end of a ban unless notified earlier
+                wakeUp = max(self.bannedUntil, (self.window + 1) * 60) - now
+                self.condition.wait(timeout=max(wakeUp, 0.01))
+            heapq.heappop(self.waiting)
+            self.used += weight
+            self.condition.notify_all()
+
+    def update(self, response, *args, **kwargs):
+        """requests response hook reading the used weight and ban headers"""
+        with self.condition:
+            self._roll()
+            used = response.headers.get("X-MBX-USED-WEIGHT-1M")
+            if used is not None:
+                self.used = max(self.used, int(used))
+            if response.status_code in (418, 429):
+                retryAfter = int(response.headers.get("Retry-After", 60))
+                self.bannedUntil = time.time() + retryAfter
+                log.warning(f"Rate limited ({response.status_code}), pausing REST calls for {retryAfter} s")
+            self.condition.notify_all()
+
+
+BUDGET = WeightBudget()
+
+
+def pooledSession(session: requests.Session = None, budget: WeightBudget = None, poolSize: int = 20) -> requests.Session:
+    """Mounts a keep-alive connection pool on a session and hooks it up to the weight budget"""
+    session = session if session is not None else requests.Session()
+    budget = budget if budget is not None else BUDGET
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=poolSize))
+    if budget.update not in session.hooks["response"]:
+        session.hooks["response"].append(budget.update)
+    return session
+
+
+SESSION = pooledSession()
+
+
+def request(path: str, params: dict = None, weight: int = 1, priority: int = NORMAL, timeout: float = 10):
+    """GET on the public REST api through the shared session
+
+    Args:
+        path (str): endpoint after /api/v3/, e.g. "depth"
+        params (dict, optional): query parameters. Defaults to None.
+        weight (int, optional): request weight. Defaults to 1.
+        priority (int, optional): CRITICAL, NORMAL or BACKGROUND. Defaults to NORMAL.
+
+    Returns:
+        decoded json response
+    """
+    BUDGET.acquire(weight, priority)
+    r = SESSION.get(f"{API_URL}/{path}", params=params, timeout=timeout)
+    r.raise_for_status()
+    return r.json()
+
+
+def depthWeight(limit: int) -> int:
+    if limit <= 100:
+        return 5
+    elif limit <= 500:
+        return 25
+    elif limit <= 1000:
+        return 50
+    return 250
+
+
+class Transport:
+    """python-binance Client wrapper routing every call through the weight budget.
+    The client's own session gets the pooled adapters and the weight header hook.
+    """
+
+    weights = {
+        "get_account": 20,
+        "get_exchange_info": 20,
+        "get_symbol_info": 20,
+        "get_klines": 2,
+        "get_historical_klines": 2,
+        "get_order": 4,
+        "get_open_orders": 6,
+        "get_order_book": 5,
+        "get_trade_fee": 1,
+        "get_asset_balance": 20,
+    }
+    priorities = {
+        "order_limit_buy": CRITICAL,
+        "order_limit_sell": CRITICAL,
+        "order_market_buy": CRITICAL,
+        "order_market_sell": CRITICAL,
+        "create_order": CRITICAL,
+        "cancel_order": CRITICAL,
+        "get_order": CRITICAL,
+        "get_symbol_info": CRITICAL,
+        "get_account": BACKGROUND,
+        "get_asset_balance": BACKGROUND,
+        "get_exchange_info": BACKGROUND,
+        "get_klines": BACKGROUND,
+        "get_historical_klines": BACKGROUND,
+    }
+
+    def __init__(self, client, budget: WeightBudget = None) -> None:
+        self.client = client
+        self.budget = budget if budget is not None else BUDGET
+        pooledSession(client.session, self.budget)
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        weight = self.weights.get(name, 1)
+        priority = self.priorities.get(name, NORMAL)
+
+        def call(*args, **kwargs):
+            self.budget.acquire(weight, priority)
+            return attr(*args, **kwargs)
+
+        return call